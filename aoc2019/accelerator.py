@@ -0,0 +1,274 @@
+from dataclasses import dataclass, field
+
+from aoc2019.intcode import CodeCache, Memory
+from aoc2019.jit import DecodedInstruction, decode_straight_line
+
+HOT_THRESHOLD = 8
+MIN_ITERATIONS = 4  # shorter runs are left to the interpreter, solving them costs more than it saves
+MAX_PLANS = 64  # plans kept per loop, one for every relative base it was entered with
+MAX_BACKOFF = 1024  # entries a loop whose values do not solve is left alone for at most
+
+
+@dataclass
+class Comparison:
+    """Flag written by `lt`/`eq`, true while `difference` is negative or zero respectively"""
+    opcode: int
+    difference: (int, int)
+
+    def value(self, iteration: int) -> int:
+        base, slope = self.difference
+        difference = base + slope * iteration
+        return 1 if (difference < 0 if self.opcode == 7 else difference == 0) else 0
+
+
+@dataclass
+class Plan:
+    """Loop body with addresses resolved for one relative base.
+
+    `steps` maps each accumulator cell, written only by `add x, step, x`, to its step operand,
+    `temporaries` are the other written cells, every iteration writes them before reading them.
+    Operands are (address, None) for cells and (None, value) for immediates.
+    """
+    operations: [(int, (int, int), (int, int), int)]  # opcode, operands, target
+    steps: {int: (int, int)}
+    temporaries: {int}
+    condition: int
+    jump_if_true: bool
+    size: int  # instructions per iteration, the closing jump included
+
+
+@dataclass
+class CountedLoop:
+    start: int
+    exit: int  # address of the backward jump closing the loop
+    instructions: [DecodedInstruction]  # None when the body can never be accelerated
+    plans: dict = field(default_factory=dict)
+    cooldown: int = 0  # entries left to skip after a failed attempt
+    backoff: int = 1
+
+
+def resolve(parameter: (int, int), relative_base: int) -> (int, int):
+    value, mode = parameter
+    if mode == 1:
+        return None, value
+    return (value if mode == 0 else relative_base + value), None
+
+
+def plan(loop: CountedLoop, relative_base: int):
+    """Plan of the loop for this relative base, None unless it counts without loop-carried temporaries"""
+    end = loop.instructions[-1].end
+    operations = []
+    for instruction in loop.instructions[:-1]:
+        a, b = (resolve(parameter, relative_base) for parameter in instruction.parameters[:2])
+        target = resolve(instruction.parameters[2], relative_base)[0]
+        if target < 0 or loop.start <= target < end or (a[0] is not None and a[0] < 0) or \
+                (b[0] is not None and b[0] < 0):
+            return None
+        operations.append((instruction.opcode, a, b, target))
+    writes = {}
+    for opcode, a, b, target in operations:
+        writes[target] = writes.get(target, 0) + 1
+    steps = {}
+    for opcode, a, b, target in operations:
+        if opcode == 1 and writes[target] == 1:
+            step = b if a == (target, None) else a if b == (target, None) else None
+            if step is not None and step[0] not in writes:
+                steps[target] = step
+    temporaries = set(writes) - set(steps)
+    written = set()
+    for opcode, a, b, target in operations:
+        if a[0] in temporaries - written or b[0] in temporaries - written:
+            return None  # a value carried from one iteration into the next
+        written.add(target)
+    condition = resolve(loop.instructions[-1].parameters[0], relative_base)[0]
+    if condition is None or condition < 0:
+        return None
+    return Plan(operations, steps, temporaries, condition, loop.instructions[-1].opcode == 5, len(loop.instructions))
+
+
+def first_exit(continues: str, base: int, slope: int):
+    """Smallest iteration i >= 0 at which `base + slope * i` breaks the continue condition, None for never"""
+    if continues == ">0":
+        return 0 if base <= 0 else None if slope >= 0 else -(base // slope)
+    if continues == "<0":
+        return 0 if base >= 0 else None if slope <= 0 else -(base // slope)
+    if continues == ">=0":
+        return 0 if base < 0 else None if slope >= 0 else base // -slope + 1
+    if continues == "==0":
+        return 0 if base != 0 else None if slope == 0 else 1
+    if base == 0:
+        return 0
+    if slope == 0 or -base % slope != 0 or -base // slope < 0:
+        return None
+    return -base // slope
+
+
+def iterate(plan: Plan, memory: Memory):
+    """Symbolic run of one iteration, every value an affine (base, slope) in the iteration number.
+
+    Returns the values written and the number of iterations that jump back, None when the loop
+    does not end or its values are not affine.
+    """
+    slopes = {cell: value if address is None else memory[address] for cell, (address, value) in plan.steps.items()}
+    values = {}
+
+    def load(operand):
+        cell, value = operand
+        if cell is None:
+            return value, 0
+        if cell in values:
+            return values[cell]
+        return memory[cell], slopes.get(cell, 0)
+
+    for opcode, a, b, target in plan.operations:
+        a, b = load(a), load(b)
+        if isinstance(a, Comparison) or isinstance(b, Comparison):
+            return None
+        if opcode == 1:
+            values[target] = a[0] + b[0], a[1] + b[1]
+        elif opcode == 2:
+            if a[1] != 0 and b[1] != 0:
+                return None
+            values[target] = a[0] * b[0], a[0] * b[1] + a[1] * b[0]
+        else:
+            values[target] = Comparison(opcode, (a[0] - b[0], a[1] - b[1]))
+    condition = load((plan.condition, None))
+    if isinstance(condition, Comparison):
+        less_than = condition.opcode == 7
+        continues = ("<0" if less_than else "==0") if plan.jump_if_true else (">=0" if less_than else "!=0")
+        condition = condition.difference
+    else:
+        continues = ">0" if plan.jump_if_true else "==0"
+    iterations = first_exit(continues, *condition)
+    return None if iterations is None else (values, iterations)
+
+
+class LoopAccelerator:
+    """Engine skipping counted loops in closed form.
+
+    A loop is a straight-line body of add/mul/lt/eq closed by a backward jump to its first instruction,
+    without IO, relative base changes or writes into its own code. Cells written only by `add x, step, x`
+    with a step that is constant over the loop count the iterations, every other cell it writes has to be
+    written before it is read in each iteration. Values are then affine in the iteration number and the
+    last iteration follows from the jump condition; the engine stores the state at the start of that
+    iteration and counts the skipped instructions. The interpreter runs the last iteration itself.
+    A loop that does not solve, e.g. one that never ends, is retried after exponentially more entries.
+
+    Loops are analysed once their backward jump gets hot and are kept in a CodeCache, so writing into
+    one drops it. `engine` optionally takes a further engine factory, e.g. `aoc2019.jit.TraceJit`,
+    which gets every jump after this one; use `functools.partial` to pass it.
+    """
+
+    def __init__(self, memory: Memory, threshold: int = HOT_THRESHOLD, engine=None):
+        self.loops = CodeCache(memory)
+        self.threshold = threshold
+        self.heat = {}
+        self.engine = None if engine is None else engine(memory)
+        self.accelerated = 0  # iterations skipped
+
+    def warm_up(self, memory: Memory, start: int, exit: int):
+        heat = self.heat.get(start, 0) + 1
+        if heat < self.threshold:
+            self.heat[start] = heat
+            return None
+        self.heat.pop(start, None)
+        instructions = decode_straight_line(memory, start)
+        closing = instructions[-1] if instructions else None
+        if closing is not None and closing.address == exit and closing.opcode in (5, 6) and \
+                closing.parameters[1] == (start, 1) and all(instruction.opcode != 9 for instruction in instructions):
+            return self.loops.put(start, closing.end, CountedLoop(start, exit, instructions))
+        # only the decoded prefix and the opcode that ended it decide a rejection
+        end = start + 1 if closing is None else closing.end + 1
+        return self.loops.put(start, end, CountedLoop(start, exit, None))
+
+    def accelerate(self, loop: CountedLoop, memory: Memory, relative_base: int, budget: int) -> int:
+        """Stores the state some iterations ahead, returns the number of instructions skipped"""
+        if relative_base in loop.plans:
+            loop_plan = loop.plans[relative_base]
+        else:
+            if len(loop.plans) >= MAX_PLANS:
+                loop.plans.clear()
+            loop_plan = loop.plans[relative_base] = plan(loop, relative_base)
+        if loop_plan is None:
+            return 0
+        solution = iterate(loop_plan, memory)
+        if solution is None:
+            loop.cooldown = loop.backoff
+            loop.backoff = min(2 * loop.backoff, MAX_BACKOFF)
+            return 0
+        loop.backoff = 1
+        values, iterations = solution
+        iterations = min(iterations, budget // loop_plan.size)
+        if iterations < MIN_ITERATIONS:
+            return 0
+        last = iterations - 1
+        for cell in loop_plan.temporaries:
+            value = values[cell]
+            memory[cell] = value.value(last) if isinstance(value, Comparison) else value[0] + value[1] * last
+        for cell in loop_plan.steps:
+            base, slope = values[cell]
+            memory[cell] = base + slope * last
+        self.accelerated += iterations
+        return iterations * loop_plan.size
+
+    def enter(self, memory: Memory, origin: int, address: int, relative_base: int, budget: int):
+        executed = 0
+        if address < origin:
+            loop = self.loops.get(address)
+            if loop is None:
+                loop = self.warm_up(memory, address, origin)
+            if loop is not None and loop.instructions is not None and loop.exit == origin:
+                if loop.cooldown:
+                    loop.cooldown -= 1
+                else:
+                    executed = self.accelerate(loop, memory, relative_base, budget)
+        if self.engine is None or executed >= budget:
+            return address, relative_base, executed
+        address, relative_base, count = self.engine.enter(memory, origin, address, relative_base, budget - executed)
+        return address, relative_base, executed + count
+
+
+if __name__ == "__main__":
+    import functools
+    from aoc2019.intcode import BudgetExhausted, ExecutionInterrupt, IntcodeProgram
+    from aoc2019.jit import TraceJit
+
+    # a countdown from a billion ends without running its iterations, counting them all the same
+    countdown = [1101, 10 ** 9, 0, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+    program = IntcodeProgram(countdown, [], engine=LoopAccelerator)
+    assert program.execute().io.outputs == [0]
+    assert program.instruction_count == 2 * 10 ** 9 + 3 and program.engine.accelerated > 10 ** 9 - 2 * HOT_THRESHOLD
+
+    # relative mode counter stepping by 3, an accumulator stepping by 5 and temporaries, against the interpreter
+    delay = [109, 200, 1101, 0, 0, 100, 1101, 0, 7, 101, 21201, 0, 3, 0, 1001, 101, 5, 101, 22102, 2, 0, 1,
+             1007, 200, 3001, 102, 1005, 102, 10, 4, 100, 4, 101, 4, 200, 4, 201, 4, 102, 99]
+    expected = IntcodeProgram(delay, [])
+    expected.execute()
+    for engine in (LoopAccelerator, functools.partial(LoopAccelerator, engine=TraceJit)):
+        program = IntcodeProgram(delay, [], engine=engine)
+        assert program.execute().io.outputs == expected.io.outputs == [0, 5012, 3003, 6006, 0]
+        assert program.instruction_count == expected.instruction_count and program.engine.accelerated > 0
+
+    # a budget stops exactly where the interpreter would, skipping only as many iterations as it allows
+    program = IntcodeProgram(countdown, [], engine=LoopAccelerator)
+    assert program.execute_until_interrupt(budget=1001) == ExecutionInterrupt.BUDGET_EXHAUSTED
+    assert program.instruction_count == 1001 and program.address == 4 and program.memory[100] == 10 ** 9 - 500
+
+    # sums of the counter are not affine, the loop runs in the interpreter
+    triangle = [1101, 0, 0, 100, 1101, 0, 0, 101, 1001, 100, 1, 100, 1, 100, 101, 101, 1007, 100, 100, 102,
+                1005, 102, 8, 4, 101, 99]
+    program = IntcodeProgram(triangle, [], engine=LoopAccelerator)
+    assert program.execute().io.outputs == [5050] and program.engine.accelerated == 0
+
+    # a loop that never ends is not solved and only retried ever more rarely
+    forever = [1001, 100, 1, 100, 1006, 101, 0]
+    program = IntcodeProgram(forever, [], engine=LoopAccelerator)
+    try:
+        program.execute(budget=10000)
+    except BudgetExhausted:
+        pass
+    assert program.memory[100] == 5000 and program.engine.loops.get(0).backoff == MAX_BACKOFF
+
+    # program = [int(s) for s in open("day09/input1.txt").read().strip().split(',')]
+    # print(IntcodeProgram(program, [2], engine=LoopAccelerator).execute().io.outputs)
+    print("SUCCESS!")
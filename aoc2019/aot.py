@@ -0,0 +1,148 @@
+import importlib.util
+import os
+
+from aoc2019.intcode import Memory, cache_directory, program_hash
+from aoc2019.jit import ARITHMETIC_OPCODES, JUMP_OPCODES, CompiledBlock, TraceJit, decode_straight_line, \
+    generate_block_source
+
+TRANSLATOR_VERSION = 2
+IO_OPCODES = {3: 2, 4: 2}
+
+_modules = {}
+
+
+def translation_name(program: [int]) -> str:
+    return f"intcode_v{TRANSLATOR_VERSION}_{program_hash(program)}"
+
+
+def block_leaders(memory: Memory, start: int = 0) -> [int]:
+    """Addresses starting a basic block reachable from start by static control flow.
+
+    Jump targets are only known for immediate mode jumps, fall-through after every jump and
+    IO instruction is a leader as well, that is where calls return to.
+    """
+    leaders = set()
+    pending = [start]
+    while pending:
+        address = pending.pop()
+        if address in leaders or address < 0:
+            continue
+        leaders.add(address)
+        while True:
+            value = memory[address]
+            opcode = value % 100
+            if opcode in IO_OPCODES:
+                pending.append(address + IO_OPCODES[opcode])
+                break
+            size = ARITHMETIC_OPCODES.get(opcode) or JUMP_OPCODES.get(opcode)
+            if size is None:
+                break
+            if opcode in JUMP_OPCODES:
+                if value // 1000 % 10 == 1:
+                    pending.append(memory[address + 2])
+                pending.append(address + size)
+                break
+            address += size
+    return sorted(leaders)
+
+
+def translate(program: [int]) -> str:
+    """Python module source with one function per basic block and a BLOCKS table dispatching on address"""
+    memory = Memory(program)
+    lines = [f"# generated by aoc2019.aot version {TRANSLATOR_VERSION}, do not edit", ""]
+    table = []
+    for leader in block_leaders(memory):
+        if leader >= len(program):
+            continue
+        instructions = decode_straight_line(memory, leader)
+        if not instructions:
+            continue
+        name = f"block_{leader}"
+        lines.append(generate_block_source(name, instructions))
+        table.append(f"    ({leader}, {instructions[-1].end}, {instructions[-1].address}, {name}),")
+    lines.append("BLOCKS = [")
+    lines.extend(table)
+    lines.append("]")
+    return "\n".join(lines) + "\n"
+
+
+def load_translation(program: [int]):
+    """Imports the translated module for the program, translating it into the on-disk cache if needed"""
+    name = translation_name(program)
+    module = _modules.get(name)
+    if module is not None:
+        return module
+    path = os.path.join(cache_directory(), f"{name}.py")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as f:
+            f.write(translate(program))
+        os.replace(temporary_path, path)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _modules[name] = module
+    return module
+
+
+class Translated(TraceJit):
+    """Engine running the ahead-of-time translation of the initial program image.
+
+    Translated blocks go into the same CodeCache as JIT blocks, so once the program writes into
+    a block it is dropped and that code runs in the interpreter from then on. Forks and restored
+    states reuse the translation of their program's image, blocks whose cells no longer match it
+    are left out.
+    """
+
+    def __init__(self, memory: Memory):
+        super().__init__(memory)
+        image = memory.image if memory.image is not None else memory.cells(0, memory.image_size)
+        for start, end, exit, function in load_translation(image).BLOCKS:
+            if all(memory[address] == image[address] for address in range(start, end)):
+                self.blocks.put(start, end, CompiledBlock(start, end, exit, None, function))
+
+    def warm_up(self, memory: Memory, address: int):
+        return None
+
+
+if __name__ == "__main__":
+    import tempfile
+    from aoc2019.intcode import ExecutionInterrupt, IntcodeProgram
+
+    os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp()
+
+    countdown = [1101, 1000, 0, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+    assert block_leaders(Memory(countdown)) == [0, 4, 11, 13]
+    assert IntcodeProgram(countdown, [], engine=Translated).execute().io.outputs == [0]
+    assert os.listdir(cache_directory()) == [f"{translation_name(countdown)}.py"]
+
+    # self modifying code drops the translated blocks it overwrites
+    self_modifying = [1101, 0, 0, 100, 1001, 100, 1, 100, 1008, 100, 60, 101, 1006, 101, 24, 1101, 0, 2, 6,
+                      1105, 1, 4, 0, 0, 1007, 100, 200, 101, 1005, 101, 4, 4, 100, 99]
+    program = IntcodeProgram(self_modifying, [], engine=Translated)
+    assert program.execute().io.outputs == [200]
+    assert program.engine.blocks.get(4) is None
+
+    assert IntcodeProgram([3, 9, 8, 9, 10, 9, 4, 9, 99, -1, 8], [8], engine=Translated).execute().io.outputs == [1]
+    assert IntcodeProgram([1102, 34915192, 34915192, 7, 4, 7, 99, 0], [],
+                          engine=Translated).execute().io.outputs == [1219070632396864]
+
+    # forks translate the program image, not their data, and skip blocks patched before the fork
+    store_inputs = [3, 9, 4, 9, 1105, 1, 0, 99, 99, 0]
+    program = IntcodeProgram(store_inputs, [], engine=Translated)
+    for value in range(4):
+        program.io.extend([value])
+        assert program.execute_until_interrupt() == ExecutionInterrupt.HAS_OUTPUT
+        fork = program.fork()
+        fork.io.extend([10 + value])
+        assert fork.execute_until_interrupt() == ExecutionInterrupt.HAS_OUTPUT and fork.io.outputs[-1] == 10 + value
+    assert len(os.listdir(cache_directory())) == 5
+    patched = IntcodeProgram(countdown, [], engine=Translated)
+    patched.memory[6] = -2
+    fork = patched.fork()
+    assert fork.engine.blocks.get(4) is None and fork.execute().io.outputs == [0] and fork.instruction_count == 1003
+
+    # program = [int(s) for s in open("day09/input1.txt").read().strip().split(',')]
+    # print(IntcodeProgram(program, [2], engine=Translated).execute().io.outputs)
+    print("SUCCESS!")
@@ -0,0 +1,219 @@
+import argparse
+import gc
+import importlib
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from aoc2019.intcode import ExecutionInterrupt, IntcodeProgram, load_program
+
+BUDGET = 5_000_000  # caps the workloads that only stop when the scripted player gives up
+
+
+def ascii_lines(lines: [str]) -> [int]:
+    return [ord(ch) for line in lines for ch in line + "\n"]
+
+
+def run_to_halt(program: [int], inputs: [int], engine) -> int:
+    run = IntcodeProgram(program, inputs, engine=engine)
+    run.execute()
+    return run.instruction_count
+
+
+def drive(program: IntcodeProgram, respond, budget: int = BUDGET) -> int:
+    """Runs an interactive program, `respond(program)` answers each request for input with a list of values.
+
+    Stops at halt, when respond returns None or when the budget is spent. Outputs are dropped as they
+    come so long runs do not grow memory. Returns the number of instructions executed.
+    """
+    while not program.halted and program.instruction_count < budget:
+        interrupt = program.execute_until_interrupt({ExecutionInterrupt.NEED_INPUT},
+                                                    budget=budget - program.instruction_count)
+        if interrupt == ExecutionInterrupt.NEED_INPUT:
+            values = respond(program)
+            if values is None:
+                break
+            program.io.extend(values)
+        program.io.drain()
+    return program.instruction_count
+
+
+def day05(engine):
+    program = load_program("day05/input.txt")
+    return sum(run_to_halt(program, [system], engine) for system in (1, 5))
+
+
+def day07(engine):
+    program = load_program("day07/input.txt")
+    count = 0
+    for phases in itertools.permutations(range(5)):
+        signal = 0
+        for phase in phases:
+            amplifier = IntcodeProgram(program, [phase, signal], engine=engine)
+            amplifier.execute()
+            signal = amplifier.io.outputs[-1]
+            count += amplifier.instruction_count
+    return count
+
+
+def day09(engine):
+    program = load_program("day09/input1.txt")
+    return sum(run_to_halt(program, [mode], engine) for mode in (1, 2))
+
+
+def day11(engine):
+    # the robot always sees black panels
+    return drive(IntcodeProgram(load_program("day11/input1.txt"), [], engine=engine), lambda program: [0])
+
+
+def day13(engine):
+    # free play, the paddle never moves and the game ends when the ball is lost
+    program = load_program("day13/input1.txt")
+    program[0] = 2
+    return drive(IntcodeProgram(program, [], engine=engine), lambda program: [0])
+
+
+def day15(engine):
+    # the droid cycles through north, east, south and west
+    moves = itertools.cycle([1, 4, 2, 3])
+    return drive(IntcodeProgram(load_program("day15/input1.txt"), [], engine=engine),
+                 lambda program: [next(moves)], budget=BUDGET // 25)
+
+
+def day17(engine):
+    program = load_program("day17/input1.txt")
+    count = run_to_halt(program, [], engine)
+    program[0] = 2
+    movement = ascii_lines(["A,C,A,B,C,A,B,C,A,B", "L,12,L,12,L,6,L,6", "L,12,L,6,R,12,R,8", "R,8,R,4,L,12", "n"])
+    return count + run_to_halt(program, movement, engine)
+
+
+def day19(engine):
+    program = load_program("day19/input1.txt")
+    return sum(run_to_halt(program, [x, y], engine) for y in range(20) for x in range(20))
+
+
+def day21(engine):
+    script = ascii_lines(["NOT A T", "OR T J", "NOT B T", "OR T J", "NOT C T", "OR T J", "AND D J",
+                          "NOT T T", "OR E T", "OR H T", "AND T J", "RUN"])
+    return run_to_halt(load_program("day21/input1.txt"), script, engine)
+
+
+def day23(engine):
+    # every NIC boots and polls an empty queue
+    program = load_program("day23/input1.txt")
+    return sum(drive(IntcodeProgram(program, [address], engine=engine), lambda program: [-1], budget=BUDGET // 500)
+               for address in range(50))
+
+
+def day25(engine):
+    # walk around the first rooms and look at the inventory, stop once the script runs out
+    commands = ["north", "south", "east", "west", "inv", "south", "north", "west", "east"]
+    return drive(IntcodeProgram(load_program("day25/input1.txt"), [], engine=engine),
+                 lambda program: ascii_lines([commands.pop(0)]) if commands else None)
+
+
+WORKLOADS = {
+    "day05": day05,
+    "day07": day07,
+    "day09": day09,
+    "day11": day11,
+    "day13": day13,
+    "day15": day15,
+    "day17": day17,
+    "day19": day19,
+    "day21": day21,
+    "day23": day23,
+    "day25": day25,
+}
+
+
+def resolve_engine(name: str):
+    """Engine factory from a dotted name like `aoc2019.jit.TraceJit`, None for the interpreter"""
+    if not name or name == "interpreter":
+        return None
+    module, _, attribute = name.rpartition(".")
+    return getattr(importlib.import_module(module), attribute)
+
+
+def measure(workload, engine, repeat: int = 3) -> dict:
+    """Best wall time of `repeat` runs, then one traced run for peak memory, the net change in allocated
+    blocks and the number of garbage collections"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        instructions = workload(engine)
+        times.append(time.perf_counter() - started)
+    gc.collect()
+    collections = sum(stats["collections"] for stats in gc.get_stats())
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    workload(engine)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = min(times)
+    return {
+        "instructions": instructions,
+        "seconds": best,
+        "instructions_per_second": instructions / best if best > 0 else None,
+        "peak_bytes": peak,
+        "net_blocks": sys.getallocatedblocks() - blocks,
+        "gc_collections": sum(stats["collections"] for stats in gc.get_stats()) - collections,
+    }
+
+
+def run(names=None, engine_name: str = None, repeat: int = 3) -> dict:
+    engine = resolve_engine(engine_name)
+    results = {}
+    for name in names or WORKLOADS:
+        results[name] = measure(WORKLOADS[name], engine, repeat)
+    return {
+        "engine": engine_name or "interpreter",
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "workloads": results,
+    }
+
+
+def report(results: dict, baseline: dict = None) -> str:
+    header = f"{'workload':<8}{'instructions':>14}{'seconds':>10}{'instr/s':>12}{'peak KiB':>10}{'net blocks':>11}" \
+             f"{'gcs':>6}"
+    if baseline is not None:
+        header += f"{'speedup':>9}"
+    lines = [f"engine {results['engine']}, python {results['python']}", header]
+    for name, entry in results["workloads"].items():
+        line = f"{name:<8}{entry['instructions']:>14}{entry['seconds']:>10.3f}" \
+               f"{entry['instructions_per_second'] or 0:>12.0f}{entry['peak_bytes'] / 1024:>10.0f}" \
+               f"{entry['net_blocks']:>11}{entry['gc_collections']:>6}"
+        previous = (baseline or {}).get("workloads", {}).get(name)
+        if previous is not None:
+            line += f"{previous['seconds'] / entry['seconds']:>8.2f}x"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the Intcode VM on the puzzle programs, "
+                                                 "run from the repository root")
+    parser.add_argument("workloads", nargs="*", help=f"default: all of {', '.join(WORKLOADS)}")
+    parser.add_argument("--engine", help="engine factory, e.g. aoc2019.jit.TraceJit or aoc2019.aot.Translated")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results of an earlier run to report speedups against")
+    arguments = parser.parse_args()
+    unknown = [name for name in arguments.workloads if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown workloads {', '.join(unknown)}, choose from {', '.join(WORKLOADS)}")
+    results = run(arguments.workloads, arguments.engine, arguments.repeat)
+    baseline = None
+    if arguments.compare:
+        with open(arguments.compare) as f:
+            baseline = json.load(f)
+    if arguments.json:
+        with open(arguments.json, "w") as f:
+            json.dump(results, f, indent=2)
+    print(report(results, baseline))
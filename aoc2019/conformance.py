@@ -0,0 +1,158 @@
+import functools
+from dataclasses import dataclass
+
+from aoc2019.accelerator import LoopAccelerator
+from aoc2019.aot import Translated
+from aoc2019.intcode import ExecutionInterrupt, IntcodeProgram
+from aoc2019.jit import TraceJit
+from aoc2019.profiler import Profiler
+from aoc2019.subroutines import SubroutineMemo
+
+
+@dataclass
+class Case:
+    name: str
+    program: [int]
+    inputs: [int]
+    outputs: [int]
+
+
+LARGER_EXAMPLE = [
+    3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31,
+    1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104,
+    999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99
+]
+QUINE = [109, 1, 204, -1, 1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99]
+
+# the examples the days asserted on their own VM copies
+CASES = [
+    Case("day05 equal to 8, position mode", [3, 9, 8, 9, 10, 9, 4, 9, 99, -1, 8], [8], [1]),
+    Case("day05 not equal to 8, position mode", [3, 9, 8, 9, 10, 9, 4, 9, 99, -1, 8], [7], [0]),
+    Case("day05 less than 8, position mode", [3, 9, 7, 9, 10, 9, 4, 9, 99, -1, 8], [7], [1]),
+    Case("day05 not less than 8, position mode", [3, 9, 7, 9, 10, 9, 4, 9, 99, -1, 8], [8], [0]),
+    Case("day05 equal to 8, immediate mode", [3, 3, 1108, -1, 8, 3, 4, 3, 99], [8], [1]),
+    Case("day05 not equal to 8, immediate mode", [3, 3, 1108, -1, 8, 3, 4, 3, 99], [7], [0]),
+    Case("day05 less than 8, immediate mode", [3, 3, 1107, -1, 8, 3, 4, 3, 99], [7], [1]),
+    Case("day05 not less than 8, immediate mode", [3, 3, 1107, -1, 8, 3, 4, 3, 99], [8], [0]),
+    Case("day05 jump if false, zero", [3, 12, 6, 12, 15, 1, 13, 14, 13, 4, 13, 99, -1, 0, 1, 9], [0], [0]),
+    Case("day05 jump if false, non zero", [3, 12, 6, 12, 15, 1, 13, 14, 13, 4, 13, 99, -1, 0, 1, 9], [10], [1]),
+    Case("day05 jump if true, zero", [3, 3, 1105, -1, 9, 1101, 0, 0, 12, 4, 12, 99, 1], [0], [0]),
+    Case("day05 jump if true, non zero", [3, 3, 1105, -1, 9, 1101, 0, 0, 12, 4, 12, 99, 1], [10], [1]),
+    Case("day05 below 8", LARGER_EXAMPLE, [7], [999]),
+    Case("day05 8", LARGER_EXAMPLE, [8], [1000]),
+    Case("day05 above 8", LARGER_EXAMPLE, [9], [1001]),
+    Case("day05 multiply into the program", [1002, 4, 3, 4, 33], [], []),
+    Case("day07 amplifier", [3, 15, 3, 16, 1002, 16, 10, 16, 1, 16, 15, 15, 4, 15, 99, 0, 0], [4, 0], [4]),
+    Case("day09 quine", QUINE, [], QUINE),
+    Case("day09 16 digit product", [1102, 34915192, 34915192, 7, 4, 7, 99, 0], [], [1219070632396864]),
+    Case("day09 large number", [104, 1125899906842624, 99], [], [1125899906842624]),
+    Case("relative base input and output", [109, 10, 203, 5, 204, 5, 99], [-3], [-3]),
+    Case("product beyond int64", [1102, 1 << 40, 1 << 40, 7, 4, 7, 99, 0], [], [1 << 80]),
+    Case("countdown loop", [1101, 1000, 0, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99], [], [0]),
+    Case("self modifying loop", [1101, 0, 0, 100, 1001, 100, 1, 100, 1008, 100, 60, 101, 1006, 101, 24, 1101, 0, 2,
+                                 6, 1105, 1, 4, 0, 0, 1007, 100, 200, 101, 1005, 101, 4, 4, 100, 99], [], [200]),
+    Case("relative write into the running loop", [109, 7, 1101, 0, 0, 100, 21101, 0, 2, 0, 1001, 100, 1, 100, 1007,
+                                                  100, 80, 101, 1005, 101, 6, 4, 100, 99], [], [80]),
+    Case("counted loop with temporaries", [1101, 0, 0, 100, 1101, 0, 7, 101, 1001, 100, 3, 100, 1001, 101, 5, 101,
+                                           102, 2, 100, 102, 1007, 100, 300, 103, 1005, 103, 8, 4, 100, 4, 101, 4,
+                                           102, 4, 103, 99], [], [300, 507, 600, 0]),
+    Case("recursive subroutine", [109, 1000, 21101, 0, 15, 1, 21101, 0, 13, 0, 1105, 1, 16, 204, 1, 99, 109, 3, 21207,
+                                  -2, 2, -1, 1205, -1, 58, 21201, -2, -1, 1, 21101, 0, 36, 0, 1105, 1, 16, 22101, 0,
+                                  1, -1, 21201, -2, -2, 1, 21101, 0, 51, 0, 1105, 1, 16, 22201, 1, -1, -2, 1105, 1,
+                                  58, 109, -3, 2105, 1, 0], [], [610]),
+    Case("subroutine doing output", [109, 100, 21101, 0, 7, 1, 21101, 0, 13, 0, 1105, 1, 27, 21101, 0, 8, 1, 21101, 0,
+                                     24, 0, 1105, 1, 27, 99, 0, 0, 109, 2, 204, -1, 109, -2, 2105, 1, 0], [], [7, 8]),
+    Case("patched compare and jump target", [1101, 0, 0, 100, 1001, 100, 1, 100, 1007, 100, 5, 101, 1005, 101, 4,
+                                             1101, 0, 26, 14, 1101, 0, 0, 100, 1105, 1, 8, 4, 100, 99], [], [0]),
+    Case("flag written into its jump", [109, 7, 21107, 1, 2, 0, 1205, 0, 20, 104, 0, 99] + [0] * 8 + [104, 1, 99],
+         [], [1]),
+]
+
+# day07 part 2, five amplifiers wired in a loop
+FEEDBACK_CASES = [
+    ([3, 26, 1001, 26, -4, 26, 3, 27, 1002, 27, 2, 27, 1, 27, 26, 27, 4, 27, 1001, 28, -1, 28, 1005, 28, 6, 99,
+      0, 0, 5], (9, 8, 7, 6, 5), 139629729),
+    ([3, 52, 1001, 52, -5, 52, 3, 53, 1, 52, 56, 54, 1007, 54, 5, 55, 1005, 55, 26, 1001, 54, -5, 54, 1105, 1, 12,
+      1, 53, 54, 53, 1008, 54, 0, 55, 1001, 55, 1, 55, 2, 53, 55, 53, 4, 53, 1001, 56, -1, 56, 1005, 56, 6, 99,
+      0, 0, 0, 0, 10], (9, 7, 8, 5, 6), 18216),
+]
+
+
+def program_factories():
+    """Ways to build an IntcodeProgram, every engine and the profiler run loop"""
+    return {
+        "interpreter": lambda program, inputs, outputs=None: IntcodeProgram(program, inputs, outputs),
+        "jit": lambda program, inputs, outputs=None: IntcodeProgram(
+            program, inputs, outputs, engine=functools.partial(TraceJit, threshold=1)),
+        "aot": lambda program, inputs, outputs=None: IntcodeProgram(program, inputs, outputs, engine=Translated),
+        "accelerator": lambda program, inputs, outputs=None: IntcodeProgram(
+            program, inputs, outputs, engine=functools.partial(
+                LoopAccelerator, threshold=1, engine=functools.partial(TraceJit, threshold=1))),
+        "memo": lambda program, inputs, outputs=None: IntcodeProgram(
+            program, inputs, outputs, engine=functools.partial(SubroutineMemo, threshold=1)),
+        "profiler": lambda program, inputs, outputs=None: IntcodeProgram(program, inputs, outputs,
+                                                                         profiler=Profiler()),
+    }
+
+
+def run_sliced(create, case: Case, budget: int = 3) -> [int]:
+    """Runs in slices of a few instructions, every resume must continue exactly where the last one stopped"""
+    program = create(case.program, list(case.inputs))
+    while program.execute_until_interrupt(set(), budget=budget) == ExecutionInterrupt.BUDGET_EXHAUSTED:
+        pass
+    return list(program.io.outputs)
+
+
+def feedback_signal(create, program: [int], phases) -> int:
+    buffers = [[phase] for phase in phases]
+    buffers[0].append(0)
+    amplifiers = [create(program, buffers[index], buffers[(index + 1) % 5]) for index in range(5)]
+    while not all(amplifier.halted for amplifier in amplifiers):
+        for amplifier in amplifiers:
+            amplifier.execute_until_interrupt({ExecutionInterrupt.HAS_OUTPUT})
+    return buffers[0][0]
+
+
+def runners():
+    """Name -> function running all CASES and returning their outputs in order"""
+    result = {}
+    for name, create in program_factories().items():
+        result[name] = functools.partial(
+            lambda create: [list(create(case.program, list(case.inputs)).execute().io.outputs) for case in CASES],
+            create)
+        result[f"{name} sliced"] = functools.partial(
+            lambda create: [run_sliced(create, case) for case in CASES], create)
+
+    def lockstep():
+        from aoc2019.lockstep import run_lockstep
+        return [run_lockstep(case.program, [case.inputs])[0] for case in CASES]
+
+    try:
+        import numpy  # noqa: F401
+        result["lockstep"] = lockstep
+    except ImportError:
+        pass
+    return result
+
+
+def check() -> [str]:
+    """Failures of every engine on the conformance cases, empty when all of them agree with the spec"""
+    failures = []
+    for name, run in runners().items():
+        for case, outputs in zip(CASES, run()):
+            if outputs != case.outputs:
+                failures.append(f"{name}: {case.name}: expected {case.outputs}, got {outputs}")
+    for name, create in program_factories().items():
+        for program, phases, expected in FEEDBACK_CASES:
+            signal = feedback_signal(create, program, phases)
+            if signal != expected:
+                failures.append(f"{name}: day07 feedback {phases}: expected {expected}, got {signal}")
+    return failures
+
+
+if __name__ == "__main__":
+    failures = check()
+    for failure in failures:
+        print(failure)
+    assert not failures
+    print("SUCCESS!")
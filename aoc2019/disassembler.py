@@ -0,0 +1,262 @@
+import json
+from dataclasses import dataclass, field
+
+from aoc2019.intcode import INSTRUCTION_TYPES, Memory
+
+MNEMONICS = {1: "add", 2: "mul", 3: "in", 4: "out", 5: "jnz", 6: "jz", 7: "lt", 8: "eq", 9: "arb", 99: "halt"}
+WRITING_OPCODES = {1: 2, 2: 2, 3: 0, 7: 2, 8: 2}  # opcode -> index of the written parameter
+JUMP_OPCODES = {5, 6}
+
+
+@dataclass
+class Operation:
+    address: int
+    opcode: int
+    parameters: [(int, int)]  # (value, mode) pairs
+
+    @property
+    def size(self) -> int:
+        return len(self.parameters) + 1
+
+    @property
+    def end(self) -> int:
+        return self.address + self.size
+
+    def write_target(self):
+        """(value, mode) of the written parameter, None when the instruction does not write memory"""
+        index = WRITING_OPCODES.get(self.opcode)
+        return None if index is None else self.parameters[index]
+
+    def jump_target(self):
+        """Statically known jump target, None for indirect jumps and anything that is not a jump"""
+        if self.opcode in JUMP_OPCODES and self.parameters[1][1] == 1:
+            return self.parameters[1][0]
+        return None
+
+    def always_jumps(self) -> bool:
+        """Jump on an immediate condition that holds, `jnz` takes values > 0 like the VM"""
+        if self.opcode not in JUMP_OPCODES or self.parameters[0][1] != 1:
+            return False
+        value = self.parameters[0][0]
+        return value > 0 if self.opcode == 5 else value == 0
+
+    def text(self) -> str:
+        operands = []
+        for value, mode in self.parameters:
+            operands.append(str(value) if mode == 1 else f"[{value}]" if mode == 0 else f"[rb{value:+d}]")
+        return f"{MNEMONICS[self.opcode]:<5}{', '.join(operands)}"
+
+
+@dataclass
+class BasicBlock:
+    start: int
+    operations: [Operation]
+    successors: [int] = field(default_factory=list)
+    indirect: bool = False  # leaves through a jump whose target is only known at run time
+
+    @property
+    def end(self) -> int:
+        return self.operations[-1].end
+
+
+def decode(memory: Memory, address: int):
+    """Operation at address, None if the value there is not a valid instruction"""
+    value = memory[address]
+    type = INSTRUCTION_TYPES.get(value % 100)
+    if type is None:
+        return None
+    modes = [value // 10 ** (order + 1) % 10 for order in range(1, type.size)]
+    if any(mode not in (0, 1, 2) for mode in modes) or value // 10 ** (type.size + 1) != 0:
+        return None
+    operation = Operation(address, type.opcode, [(memory[address + order], mode)
+                                                 for order, mode in enumerate(modes, 1)])
+    target = operation.write_target()
+    return None if target is not None and target[1] == 1 else operation
+
+
+class Disassembly:
+    """Statically reachable code of an Intcode image, its basic blocks and control-flow graph.
+
+    Code is followed from address 0 along fall-through and immediate mode jump targets. Indirect
+    jumps, the returns of Intcode subroutines, are resolved by also following code pointers: immediate
+    values stored by `add x, 0` / `mul x, 1` into memory that point at the image and decode cleanly.
+    """
+
+    def __init__(self, program: [int], start: int = 0):
+        self.image = list(program)
+        memory = Memory(program)
+        self.operations = {}
+        self._walk(memory, [start])
+        followed = set()
+        while True:
+            # code pointers into the middle of known instructions are data that happens to be small
+            covered = self.code_addresses()
+            pointers = {value for value in self._code_pointers() if value not in covered} - followed
+            if not pointers:
+                break
+            followed |= pointers
+            self._walk(memory, sorted(pointers))
+        self.blocks = self._build_blocks()
+
+    def _walk(self, memory: Memory, pending: [int]):
+        size = len(self.image)
+        while pending:
+            address = pending.pop()
+            while 0 <= address < size and address not in self.operations:
+                operation = decode(memory, address)
+                if operation is None:
+                    break
+                self.operations[address] = operation
+                if operation.opcode == 99:
+                    break
+                target = operation.jump_target()
+                if target is not None:
+                    pending.append(target)
+                if operation.always_jumps():
+                    break
+                address = operation.end
+
+    def _code_pointers(self):
+        for operation in list(self.operations.values()):
+            (a, a_mode), (b, b_mode) = operation.parameters[:2] if operation.size == 4 else ((0, 0), (0, 0))
+            if a_mode == 1 and b_mode == 1 and operation.opcode in (1, 2):
+                neutral = 0 if operation.opcode == 1 else 1
+                if b == neutral and 0 <= a < len(self.image):
+                    yield a
+                elif a == neutral and 0 <= b < len(self.image):
+                    yield b
+
+    def _build_blocks(self) -> {int: BasicBlock}:
+        falls_through = {operation.end for operation in self.operations.values()
+                         if operation.opcode != 99 and operation.opcode not in JUMP_OPCODES}
+        leaders = {address for address in self.operations if address not in falls_through}
+        for operation in self.operations.values():
+            if operation.opcode in JUMP_OPCODES:
+                leaders.update(address for address in (operation.jump_target(), operation.end)
+                               if address in self.operations)
+        blocks = {}
+        for leader in sorted(leaders):
+            operations = [self.operations[leader]]
+            while operations[-1].opcode not in JUMP_OPCODES and operations[-1].opcode != 99 and \
+                    operations[-1].end in self.operations and operations[-1].end not in leaders:
+                operations.append(self.operations[operations[-1].end])
+            block = BasicBlock(leader, operations)
+            last = operations[-1]
+            if last.opcode in JUMP_OPCODES:
+                if last.jump_target() is None:
+                    block.indirect = True
+                elif last.jump_target() in self.operations:
+                    block.successors.append(last.jump_target())
+                if not last.always_jumps() and last.end in self.operations:
+                    block.successors.append(last.end)
+            elif last.opcode != 99 and last.end in self.operations:
+                block.successors.append(last.end)
+            blocks[leader] = block
+        return blocks
+
+    def code_addresses(self) -> {int}:
+        """Every memory cell holding an opcode or parameter of reachable code"""
+        return {address for operation in self.operations.values()
+                for address in range(operation.address, operation.end)}
+
+    def code_writes(self) -> [Operation]:
+        """Instructions writing into reachable code through a statically known address"""
+        code = self.code_addresses()
+        return [operation for operation in self.operations.values()
+                if operation.write_target() is not None and operation.write_target()[1] == 0
+                and operation.write_target()[0] in code]
+
+    def dynamic_writes(self) -> [Operation]:
+        """Relative mode writes, their targets and so whether they hit code are only known at run time"""
+        return [operation for operation in self.operations.values()
+                if operation.write_target() is not None and operation.write_target()[1] == 2]
+
+    def static_regions(self) -> [(int, int)]:
+        """Half-open address ranges of code no instruction writes to through a known address"""
+        code = self.code_addresses()
+        written = {operation.write_target()[0] for operation in self.code_writes()}
+        regions = []
+        for address in sorted(code - written):
+            if regions and regions[-1][1] == address:
+                regions[-1] = (regions[-1][0], address + 1)
+            else:
+                regions.append((address, address + 1))
+        return regions
+
+    def to_json(self, counts=None) -> dict:
+        """CFG as plain data, `counts` maps addresses to execution counts, e.g. `Profiler().addresses`"""
+        counts = counts or {}
+        return {
+            "size": len(self.image),
+            "blocks": [{
+                "start": block.start,
+                "end": block.end,
+                "successors": block.successors,
+                "indirect": block.indirect,
+                "count": counts.get(block.start, 0),
+                "instructions": [{"address": operation.address, "opcode": operation.opcode,
+                                  "text": operation.text()} for operation in block.operations],
+            } for block in self.blocks.values()],
+            "code_writes": [operation.address for operation in self.code_writes()],
+            "dynamic_writes": [operation.address for operation in self.dynamic_writes()],
+            "static_regions": [list(region) for region in self.static_regions()],
+        }
+
+    def dump(self, path: str, counts=None):
+        with open(path, "w") as f:
+            json.dump(self.to_json(counts), f, indent=2)
+
+    def listing(self, counts=None) -> str:
+        """Text listing block by block, code writes are flagged, `counts` adds execution counts per block"""
+        code_writes = {operation.address for operation in self.code_writes()}
+        dynamic_writes = {operation.address for operation in self.dynamic_writes()}
+        lines = []
+        for block in self.blocks.values():
+            successors = ", ".join(str(successor) for successor in block.successors)
+            if block.indirect:
+                successors = f"{successors}, *" if successors else "*"
+            count = f"  x{counts.get(block.start, 0)}" if counts is not None else ""
+            lines.append(f"block {block.start}..{block.end} -> {successors or '-'}{count}")
+            for operation in block.operations:
+                note = "  ; writes code" if operation.address in code_writes else \
+                    "  ; relative write" if operation.address in dynamic_writes else ""
+                lines.append(f"{operation.address:>7}  {operation.text()}{note}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+def disassemble(program: [int], start: int = 0) -> Disassembly:
+    return Disassembly(program, start)
+
+
+if __name__ == "__main__":
+    countdown = [1101, 1000, 0, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+    disassembly = disassemble(countdown)
+    assert sorted(disassembly.blocks) == [0, 4, 11]
+    assert disassembly.blocks[4].successors == [4, 11] and disassembly.blocks[0].successors == [4]
+    assert disassembly.code_writes() == [] and disassembly.static_regions() == [(0, 14)]
+    assert "jnz  [100], 4" in disassembly.listing()
+
+    # writing the increment of the loop makes that cell non static
+    self_modifying = [1101, 0, 0, 100, 1001, 100, 1, 100, 1008, 100, 60, 101, 1006, 101, 24, 1101, 0, 2, 6,
+                      1105, 1, 4, 0, 0, 1007, 100, 200, 101, 1005, 101, 4, 4, 100, 99]
+    disassembly = disassemble(self_modifying)
+    assert [operation.address for operation in disassembly.code_writes()] == [15]
+    assert disassembly.static_regions() == [(0, 6), (7, 22), (24, 34)]
+    assert disassembly.blocks[15].successors == [4] and 22 not in disassembly.operations
+
+    # jnz on a negative immediate falls through
+    negative = [1105, -5, 6, 104, 1, 99, 104, 2, 99]
+    assert disassemble(negative).blocks[0].successors == [6, 3]
+    assert disassemble([1105, 5, 6, 104, 1, 99, 104, 2, 99]).blocks[0].successors == [6]
+
+    # a call pushes its return address with `add ret, 0`, the indirect return is followed through it
+    call = [109, 100, 21101, 9, 0, 0, 1105, 1, 12, 104, 7, 99, 2106, 0, 0]
+    disassembly = disassemble(call)
+    assert disassembly.blocks[12].indirect and 9 in disassembly.blocks
+    assert [operation.address for operation in disassembly.dynamic_writes()] == [2]
+    assert disassembly.to_json({12: 1})["blocks"][-1]["count"] == 1
+
+    # program = [int(s) for s in open("day13/input1.txt").read().strip().split(',')]
+    # print(disassemble(program).listing())
+    print("SUCCESS!")
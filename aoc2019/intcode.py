@@ -1,38 +1,242 @@
+import copy
+import functools
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from enum import Enum
 
 
+PAGE_BITS = 9
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+# cells holding this value have their actual value in Memory.big
+PROMOTED = -(1 << 63)
+
+
+@dataclass
+class MemorySnapshot:
+    image_size: int
+    dense: bytes
+    sparse: dict
+    big: dict
+
+
 class Memory:
+    """Paged sparse memory of int64 cells.
+
+    Pages covering the initial program image sit in a dense list, any other page is allocated
+    on its first write, so reading an untouched address is 0 and footprint follows touched pages.
+    Pages are `array('q')`, a value that does not fit int64 is promoted into the `big` side table
+    and its cell is marked with PROMOTED. Forked memories share pages until either side writes,
+    `owned` holds the indices of pages a memory copied since its last fork, None while it was never
+    forked and owns every page. `image` is the program the memory was created from, shared by forks
+    and None for restored snapshots.
+    """
+
     def __init__(self, initial_memory):
-        self.memory = initial_memory.copy()
+        self.image = initial_memory
+        self.image_size = len(initial_memory)
+        self.big = {}
+        self.dense = []
+        # an int64 image, e.g. from load_program, is copied into the pages without unboxing every value
+        raw = isinstance(initial_memory, array) and initial_memory.typecode == 'q' and PROMOTED not in initial_memory
+        for start in range(0, self.image_size, PAGE_SIZE):
+            if raw:
+                page = initial_memory[start:start + PAGE_SIZE]
+                page.frombytes(bytes(8 * (PAGE_SIZE - len(page))))
+                self.dense.append(page)
+                continue
+            page = self._page()
+            self.dense.append(page)
+            for address, value in enumerate(initial_memory[start:start + PAGE_SIZE], start):
+                self._store(page, address, value)
+        self.dense_limit = len(self.dense) * PAGE_SIZE
+        self.sparse = {}
+        self.owned = None
+        self.shared_tables = False  # dense, sparse and big are still the objects of a fork
+        self.watchers = {}
 
-    def _extend_to(self, address: int):
-        if address >= len(self.memory):
-            additional_storage = [0] * (address - len(self.memory) + 1)
-            self.memory.extend(additional_storage)
+    @staticmethod
+    def _page():
+        return array('q', bytes(8 * PAGE_SIZE))
+
+    def _store(self, page: array, address: int, value: int):
+        if self.big:
+            self.big.pop(address, None)
+        if value == PROMOTED:
+            page[address & PAGE_MASK] = PROMOTED
+            self.big[address] = value
+            return
+        try:
+            page[address & PAGE_MASK] = value
+        except OverflowError:
+            page[address & PAGE_MASK] = PROMOTED
+            self.big[address] = value
 
     def __getitem__(self, address: int):
-        self._extend_to(address)
-        return self.memory[address]
+        if 0 <= address < self.dense_limit:
+            value = self.dense[address >> PAGE_BITS][address & PAGE_MASK]
+        elif address < 0:
+            raise Exception(f"Can not read memory at negative address {address}")
+        else:
+            page = self.sparse.get(address >> PAGE_BITS)
+            value = 0 if page is None else page[address & PAGE_MASK]
+        return value if value != PROMOTED else self.big[address]
 
     def __setitem__(self, address: int, value: int):
-        self._extend_to(address)
-        self.memory[address] = value
+        index = address >> PAGE_BITS
+        if 0 <= address < self.dense_limit:
+            page = self.dense[index]
+        elif address < 0:
+            raise Exception(f"Can not write memory at negative address {address}")
+        else:
+            page = self.sparse.get(index)
+            if page is None:
+                if self.shared_tables:
+                    self._own_tables()
+                page = self.sparse[index] = self._page()
+                if self.owned is not None:
+                    self.owned.add(index)
+        if self.owned is not None and index not in self.owned:
+            page = self._unshare(index)
+        if value == PROMOTED or self.big:
+            self._store(page, address, value)
+        else:
+            try:
+                page[address & PAGE_MASK] = value
+            except OverflowError:
+                self._store(page, address, value)
+        if address in self.watchers:
+            for cache in self.watchers.pop(address):
+                cache.invalidate(address)
+
+    def _own_tables(self):
+        self.dense, self.sparse, self.big = list(self.dense), dict(self.sparse), dict(self.big)
+        self.shared_tables = False
+
+    def _unshare(self, index: int) -> array:
+        if self.shared_tables:
+            self._own_tables()
+        self.owned.add(index)
+        pages = self.dense if index < len(self.dense) else self.sparse
+        page = pages[index] = array('q', pages[index])
+        return page
+
+    def fork(self):
+        """Copy sharing pages and page tables with this memory, O(1) whatever the memory size.
+
+        Each side copies the page tables on its first write after the fork, references only, O(pages)
+        once, and every page on its first write to it, so page data is copied for written pages only.
+        """
+        memory = Memory([])
+        memory.image, memory.image_size, memory.dense_limit = self.image, self.image_size, self.dense_limit
+        memory.dense, memory.sparse, memory.big = self.dense, self.sparse, self.big
+        self.owned, memory.owned = set(), set()
+        self.shared_tables = memory.shared_tables = True
+        return memory
+
+    def cells(self, start: int, end: int) -> [int]:
+        return [self[address] for address in range(start, end)]
+
+    def page_count(self) -> int:
+        return len(self.dense) + len(self.sparse)
+
+    def snapshot(self) -> MemorySnapshot:
+        return MemorySnapshot(
+            self.image_size,
+            b"".join(page.tobytes() for page in self.dense),
+            {index: page.tobytes() for index, page in self.sparse.items()},
+            dict(self.big)
+        )
+
+    @classmethod
+    def restore(cls, snapshot: MemorySnapshot):
+        memory = cls([])
+        memory.image, memory.image_size = None, snapshot.image_size
+        dense = array('q', snapshot.dense)
+        memory.dense = [dense[start:start + PAGE_SIZE] for start in range(0, len(dense), PAGE_SIZE)]
+        memory.dense_limit = len(memory.dense) * PAGE_SIZE
+        memory.sparse = {index: array('q', page) for index, page in snapshot.sparse.items()}
+        memory.big = dict(snapshot.big)
+        return memory
+
+
+class CodeCache:
+    """Objects decoded from a span of memory, dropped as soon as any cell of their span is written"""
+
+    def __init__(self, memory: Memory):
+        self.memory = memory
+        self.entries = {}
+        self.spans = {}
+
+    def get(self, address: int):
+        return self.entries.get(address)
+
+    def put(self, start: int, end: int, entry):
+        self.entries[start] = entry
+        for address in range(start, end):
+            self.spans.setdefault(address, set()).add(start)
+            self.memory.watchers.setdefault(address, set()).add(self)
+        return entry
+
+    def invalidate(self, address: int):
+        for start in self.spans.pop(address, ()):
+            self.entries.pop(start, None)
 
 
 class IO:
+    """Input and output channels.
+
+    Inputs are consumed from a deque. A plain list passed as inputs stays the producer side,
+    whatever callers append to it is moved into the deque in bulk on the next read.
+    """
+
     def __init__(self, inputs, outputs):
         self.inputs = inputs
         self.outputs = outputs
+        self.buffer = inputs if isinstance(inputs, deque) else deque()
+
+    def _pull(self):
+        if self.inputs and self.buffer is not self.inputs:
+            self.buffer.extend(self.inputs)
+            self.inputs.clear()
+
+    def has_input(self) -> bool:
+        return bool(self.buffer) or bool(self.inputs)
 
     def read(self):
-        if not self.inputs:
-            raise Exception("IO input buffer is empty when trying to read")
-        return self.inputs.pop(0)
+        if not self.buffer:
+            self._pull()
+            if not self.buffer:
+                raise Exception("IO input buffer is empty when trying to read")
+        return self.buffer.popleft()
+
+    def extend(self, values):
+        self._pull()
+        self.buffer.extend(values)
 
     def write(self, value: int):
         self.outputs.append(value)
 
+    def drain(self) -> [int]:
+        values = list(self.outputs)
+        self.outputs.clear()
+        return values
+
+    def pending(self) -> [int]:
+        self._pull()
+        return list(self.buffer)
+
+    def fork(self):
+        return IO(deque(self.pending()), type(self.outputs)(self.outputs))
+
 
 @dataclass
 class ProgramState:
@@ -66,22 +270,28 @@ class Parameter:
     mode: ParameterMode
 
     def read(self, state: ProgramState):
-        if self.mode == ParameterMode.POSITION:
-            return state.memory[self.value]
-        elif self.mode == ParameterMode.IMMEDIATE:
+        return self.load(state.memory, state.relative_base)
+
+    def write(self, state: ProgramState, value):
+        self.store(state.memory, state.relative_base, value)
+
+    def load(self, memory: Memory, relative_base: int):
+        if self.mode is ParameterMode.POSITION:
+            return memory[self.value]
+        elif self.mode is ParameterMode.IMMEDIATE:
             return self.value
-        elif self.mode == ParameterMode.RELATIVE:
-            return state.memory[state.relative_base + self.value]
+        elif self.mode is ParameterMode.RELATIVE:
+            return memory[relative_base + self.value]
         else:
             raise Exception(f"Unknown parameter mode {self.mode}")
 
-    def write(self, state: ProgramState, value):
-        if self.mode == ParameterMode.POSITION:
-            state.memory[self.value] = value
-        elif self.mode == ParameterMode.IMMEDIATE:
+    def store(self, memory: Memory, relative_base: int, value):
+        if self.mode is ParameterMode.POSITION:
+            memory[self.value] = value
+        elif self.mode is ParameterMode.IMMEDIATE:
             raise Exception("Can not write to memory at the position of immediate parameter")
-        elif self.mode == ParameterMode.RELATIVE:
-            state.memory[state.relative_base + self.value] = value
+        elif self.mode is ParameterMode.RELATIVE:
+            memory[relative_base + self.value] = value
         else:
             raise Exception(f"Unknown parameter mode {self.mode}")
 
@@ -94,26 +304,43 @@ class InstructionDescriptor:
         return self.value % 100
 
     def parameter_mode(self, parameter_order: int) -> ParameterMode:
-        digit_position = parameter_order + 1
-        mode = ((self.value % pow(10, digit_position + 1)) - (self.value % pow(10, digit_position)))//pow(10, digit_position)
-        return ParameterMode(mode)
+        return ParameterMode(self.value // 10 ** (parameter_order + 1) % 10)
+
+
+class Instruction(ABC):
+    """Base for decoded instructions.
+
+    `run` works on the raw registers and returns the address of the next instruction,
+    `execute` is the same step expressed over a ProgramState.
+    """
+
+    @abstractmethod
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
+        pass
+
+    def execute(self, state: ProgramState):
+        return state.with_address(self.run(state.memory, state.io, state.address, state.relative_base))
 
 
 @dataclass
-class HaltInstruction:
+class HaltInstruction(Instruction):
+    opcode = 99
+    size = 1
 
-    @staticmethod
-    def from_memory(state: ProgramState):
+    @classmethod
+    def from_memory(cls, state: ProgramState):
         descriptor = InstructionDescriptor(state.address_offset())
-        return HaltInstruction() if descriptor.opcode() == 99 else None
+        return cls() if descriptor.opcode() == cls.opcode else None
 
-    def execute(self, state: ProgramState):
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
         # NOOP
-        return state
+        return address
 
 
 @dataclass
-class AddInstruction:
+class AddInstruction(Instruction):
+    opcode = 1
+    size = 4
     parameter1: Parameter
     parameter2: Parameter
     parameter3: Parameter
@@ -125,16 +352,18 @@ class AddInstruction:
             Parameter(state.address_offset(1), descriptor.parameter_mode(1)),
             Parameter(state.address_offset(2), descriptor.parameter_mode(2)),
             Parameter(state.address_offset(3), descriptor.parameter_mode(3))
-        ) if descriptor.opcode() == 1 else None
+        ) if descriptor.opcode() == cls.opcode else None
 
-    def execute(self, state: ProgramState):
-        result = self.parameter1.read(state) + self.parameter2.read(state)
-        self.parameter3.write(state, result)
-        return state.advance(4)
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
+        result = self.parameter1.load(memory, relative_base) + self.parameter2.load(memory, relative_base)
+        self.parameter3.store(memory, relative_base, result)
+        return address + 4
 
 
 @dataclass
-class MultiplyInstruction:
+class MultiplyInstruction(Instruction):
+    opcode = 2
+    size = 4
     parameter1: Parameter
     parameter2: Parameter
     parameter3: Parameter
@@ -146,16 +375,18 @@ class MultiplyInstruction:
             Parameter(state.address_offset(1), descriptor.parameter_mode(1)),
             Parameter(state.address_offset(2), descriptor.parameter_mode(2)),
             Parameter(state.address_offset(3), descriptor.parameter_mode(3))
-        ) if descriptor.opcode() == 2 else None
+        ) if descriptor.opcode() == cls.opcode else None
 
-    def execute(self, state: ProgramState):
-        result = self.parameter1.read(state) * self.parameter2.read(state)
-        self.parameter3.write(state, result)
-        return state.advance(4)
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
+        result = self.parameter1.load(memory, relative_base) * self.parameter2.load(memory, relative_base)
+        self.parameter3.store(memory, relative_base, result)
+        return address + 4
 
 
 @dataclass
-class InputInstruction:
+class InputInstruction(Instruction):
+    opcode = 3
+    size = 2
     parameter: Parameter
 
     @classmethod
@@ -163,15 +394,17 @@ class InputInstruction:
         descriptor = InstructionDescriptor(state.address_offset())
         return cls(
             Parameter(state.address_offset(1), descriptor.parameter_mode(1)),
-        ) if descriptor.opcode() == 3 else None
+        ) if descriptor.opcode() == cls.opcode else None
 
-    def execute(self, state: ProgramState):
-        self.parameter.write(state, state.io.read())
-        return state.advance(2)
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
+        self.parameter.store(memory, relative_base, io.read())
+        return address + 2
 
 
 @dataclass
-class OutputInstruction:
+class OutputInstruction(Instruction):
+    opcode = 4
+    size = 2
     parameter: Parameter
 
     @classmethod
@@ -179,15 +412,17 @@ class OutputInstruction:
         descriptor = InstructionDescriptor(state.address_offset())
         return cls(
             Parameter(state.address_offset(1), descriptor.parameter_mode(1)),
-        ) if descriptor.opcode() == 4 else None
+        ) if descriptor.opcode() == cls.opcode else None
 
-    def execute(self, state: ProgramState):
-        state.io.write(self.parameter.read(state))
-        return state.advance(2)
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
+        io.write(self.parameter.load(memory, relative_base))
+        return address + 2
 
 
 @dataclass
-class JumpIfTrueInstruction:
+class JumpIfTrueInstruction(Instruction):
+    opcode = 5
+    size = 3
     parameter1: Parameter
     parameter2: Parameter
 
@@ -197,17 +432,19 @@ class JumpIfTrueInstruction:
         return cls(
             Parameter(state.address_offset(1), descriptor.parameter_mode(1)),
             Parameter(state.address_offset(2), descriptor.parameter_mode(2))
-        ) if descriptor.opcode() == 5 else None
+        ) if descriptor.opcode() == cls.opcode else None
 
-    def execute(self, state: ProgramState):
-        if self.parameter1.read(state) > 0:
-            return state.with_address(self.parameter2.read(state))
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
+        if self.parameter1.load(memory, relative_base) > 0:
+            return self.parameter2.load(memory, relative_base)
         else:
-            return state.advance(3)
+            return address + 3
 
 
 @dataclass
-class JumpIfFalseInstruction:
+class JumpIfFalseInstruction(Instruction):
+    opcode = 6
+    size = 3
     parameter1: Parameter
     parameter2: Parameter
 
@@ -217,17 +454,19 @@ class JumpIfFalseInstruction:
         return cls(
             Parameter(state.address_offset(1), descriptor.parameter_mode(1)),
             Parameter(state.address_offset(2), descriptor.parameter_mode(2))
-        ) if descriptor.opcode() == 6 else None
+        ) if descriptor.opcode() == cls.opcode else None
 
-    def execute(self, state: ProgramState):
-        if self.parameter1.read(state) == 0:
-            return state.with_address(self.parameter2.read(state))
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
+        if self.parameter1.load(memory, relative_base) == 0:
+            return self.parameter2.load(memory, relative_base)
         else:
-            return state.advance(3)
+            return address + 3
 
 
 @dataclass
-class LessThenInstruction:
+class LessThenInstruction(Instruction):
+    opcode = 7
+    size = 4
     parameter1: Parameter
     parameter2: Parameter
     parameter3: Parameter
@@ -239,18 +478,20 @@ class LessThenInstruction:
             Parameter(state.address_offset(1), descriptor.parameter_mode(1)),
             Parameter(state.address_offset(2), descriptor.parameter_mode(2)),
             Parameter(state.address_offset(3), descriptor.parameter_mode(3))
-        ) if descriptor.opcode() == 7 else None
+        ) if descriptor.opcode() == cls.opcode else None
 
-    def execute(self, state: ProgramState):
-        if self.parameter1.read(state) < self.parameter2.read(state):
-            self.parameter3.write(state, 1)
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
+        if self.parameter1.load(memory, relative_base) < self.parameter2.load(memory, relative_base):
+            self.parameter3.store(memory, relative_base, 1)
         else:
-            self.parameter3.write(state, 0)
-        return state.advance(4)
+            self.parameter3.store(memory, relative_base, 0)
+        return address + 4
 
 
 @dataclass
-class EqualsInstruction:
+class EqualsInstruction(Instruction):
+    opcode = 8
+    size = 4
     parameter1: Parameter
     parameter2: Parameter
     parameter3: Parameter
@@ -262,18 +503,20 @@ class EqualsInstruction:
             Parameter(state.address_offset(1), descriptor.parameter_mode(1)),
             Parameter(state.address_offset(2), descriptor.parameter_mode(2)),
             Parameter(state.address_offset(3), descriptor.parameter_mode(3))
-        ) if descriptor.opcode() == 8 else None
+        ) if descriptor.opcode() == cls.opcode else None
 
-    def execute(self, state: ProgramState):
-        if self.parameter1.read(state) == self.parameter2.read(state):
-            self.parameter3.write(state, 1)
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
+        if self.parameter1.load(memory, relative_base) == self.parameter2.load(memory, relative_base):
+            self.parameter3.store(memory, relative_base, 1)
         else:
-            self.parameter3.write(state, 0)
-        return state.advance(4)
+            self.parameter3.store(memory, relative_base, 0)
+        return address + 4
 
 
 @dataclass
-class RelativeBaseOffsetInstruction:
+class RelativeBaseOffsetInstruction(Instruction):
+    opcode = 9
+    size = 2
     parameter: Parameter
 
     @classmethod
@@ -281,59 +524,558 @@ class RelativeBaseOffsetInstruction:
         descriptor = InstructionDescriptor(state.address_offset())
         return cls(
             Parameter(state.address_offset(1), descriptor.parameter_mode(1))
-        ) if descriptor.opcode() == 9 else None
+        ) if descriptor.opcode() == cls.opcode else None
+
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
+        # relative base is a register of the run loop, returning only the address would drop the offset
+        raise Exception(f"Relative base offset at position {address} has to be applied with next_relative_base")
+
+    def next_relative_base(self, memory: Memory, relative_base: int) -> int:
+        return relative_base + self.parameter.load(memory, relative_base)
 
     def execute(self, state: ProgramState):
-        # TODO: do something with relative_base
         offset = self.parameter.read(state)
 
         return state.advance(2).advance_relative_base(offset)
 
 
+class FusedInstruction(Instruction):
+    """Superinstruction covering two adjacent instructions, dispatched once by the run loop.
+
+    It is cached over the cells of both instructions, so a write to either drops it like any decoded
+    instruction. Opcodes are above 99 so the run loop can tell fused ones apart with a single compare.
+    """
+    first: Instruction
+    second: Instruction
+
+
+@dataclass
+class CompareJumpInstruction(FusedInstruction):
+    """`lt`/`eq` writing a flag immediately tested by the following `jnz`/`jz`"""
+    opcode = 100
+    first: Instruction
+    second: Instruction
+
+    def __post_init__(self):
+        self.size = self.first.size + self.second.size
+        self.less_than = self.first.opcode == LessThenInstruction.opcode
+        self.jump_if_true = self.second.opcode == JumpIfTrueInstruction.opcode
+        target = self.first.parameter3
+        self.relative_target = target.mode is ParameterMode.RELATIVE
+        self.target = target.value
+
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
+        first = self.first
+        a, b = first.parameter1.load(memory, relative_base), first.parameter2.load(memory, relative_base)
+        flag = (a < b) if self.less_than else (a == b)
+        if self.relative_target:
+            target = relative_base + self.target
+            memory[target] = 1 if flag else 0
+            if address <= target < address + self.size:
+                # the flag was written into this very pair, the jump has to be decoded again; the write
+                # dropped the pair from the cache, which tells the run loop that only the compare ran
+                return address + 4
+        else:
+            memory[self.target] = 1 if flag else 0
+        if flag == self.jump_if_true:
+            return self.second.parameter2.load(memory, relative_base)
+        return address + self.size
+
+
+@dataclass
+class OffsetJumpInstruction(FusedInstruction):
+    """`arb` followed by a jump, the return sequence of Intcode subroutines; the run loop applies the offset"""
+    opcode = 101
+    first: Instruction
+    second: Instruction
+
+    def __post_init__(self):
+        self.size = self.first.size + self.second.size
+        self.parameter = self.first.parameter
+
+    def run(self, memory: Memory, io: IO, address: int, relative_base: int) -> int:
+        return self.second.run(memory, io, address + 2, relative_base)
+
+
+def fuse(first: Instruction, second: Instruction):
+    """Superinstruction for an adjacent pair, None when the pair is not one of the fused idioms"""
+    if second.opcode != 5 and second.opcode != 6:
+        return None
+    if first.opcode == 7 or first.opcode == 8:
+        flag, condition = first.parameter3, second.parameter1
+        if flag == condition and flag.mode is not ParameterMode.IMMEDIATE:
+            return CompareJumpInstruction(first, second)
+    elif first.opcode == 9:
+        return OffsetJumpInstruction(first, second)
+    return None
+
+
+INSTRUCTION_TYPES = {
+    type.opcode: type for type in [
+        HaltInstruction,
+        AddInstruction, MultiplyInstruction, InputInstruction, OutputInstruction,
+        JumpIfTrueInstruction, JumpIfFalseInstruction, LessThenInstruction, EqualsInstruction,
+        RelativeBaseOffsetInstruction
+    ]
+}
+
+
+@dataclass
+class OutputCondition:
+    count: int = 0
+    value: int = None
+    predicate: object = None
+
+    def holds(self, program) -> bool:
+        outputs = program.io.outputs
+        return len(outputs) >= self.count and (self.value is None or outputs[-1] == self.value) and \
+            (self.predicate is None or self.predicate(program))
+
+
+@dataclass
+class AsciiOutput:
+    text: str
+    values: [int]  # outputs outside of the ASCII range, e.g. a final answer
+    interrupt: object
+
+
 class ExecutionInterrupt(Enum):
     HALT = 0
     NEED_INPUT = 1
     HAS_OUTPUT = 2
+    BUDGET_EXHAUSTED = 3
 
 
-class IntcodeProgram:
-    state: ProgramState
+class BudgetExhausted(Exception):
+    """Raised by IntcodeProgram.execute when the instruction budget or timeout runs out, the program can be resumed"""
+
+
+# the clock is read once per this many instructions when a timeout is set
+CLOCK_CHECK_STEPS = 4096
 
-    def __init__(self, program, inputs, outputs=None):
-        self.state = ProgramState(Memory(program), 0, 0, IO(inputs, [] if outputs is None else outputs))
+
+class IntcodeProgram:
+    """Intcode VM.
+
+    The instruction pointer and the relative base are plain ints kept on the program
+    and in the locals of the run loop, `state` is a ProgramState view built on request.
+
+    `engine` optionally takes a factory called with the program memory, e.g. `aoc2019.jit.TraceJit`.
+    The run loop hands every resume and every jump to `engine.enter`, which may run compiled code from there.
+    `profiler`, e.g. `aoc2019.profiler.Profiler()`, replaces the run loop with its instrumented one.
+    """
+
+    def __init__(self, program, inputs, outputs=None, engine=None, profiler=None):
+        self.image = program
+        self.memory = Memory(program)
+        self.io = IO(inputs, [] if outputs is None else outputs)
+        self.address = 0
+        self.relative_base = 0
         self.halted = False
-        self.instruction_types = [
-            HaltInstruction,
-            AddInstruction, MultiplyInstruction, InputInstruction, OutputInstruction,
-            JumpIfTrueInstruction, JumpIfFalseInstruction, LessThenInstruction, EqualsInstruction,
-            RelativeBaseOffsetInstruction
-        ]
+        self.instruction_types = INSTRUCTION_TYPES
+        self.instructions = CodeCache(self.memory)
+        self.engine_type = engine
+        self.engine = None if engine is None else engine(self.memory)
+        self.profiler = profiler
+        self.instruction_count = 0
+
+    @property
+    def state(self) -> ProgramState:
+        return ProgramState(self.memory, self.address, self.relative_base, self.io)
+
+    @state.setter
+    def state(self, state: ProgramState):
+        if state.memory is not self.memory:
+            self.memory = state.memory
+            if self.memory.image is None:
+                self.memory.image = self.image
+            self.instructions = CodeCache(self.memory)
+            self.engine = None if self.engine_type is None else self.engine_type(self.memory)
+        self.io = state.io
+        self.address = state.address
+        self.relative_base = state.relative_base
+
+    def fork(self):
+        """Independent copy of the running program, memory pages are shared copy-on-write"""
+        program = copy.copy(self)
+        program.memory = self.memory.fork()
+        program.io = self.io.fork()
+        program.instructions = CodeCache(program.memory)
+        program.engine = None if self.engine_type is None else self.engine_type(program.memory)
+        return program
+
+    def decode(self, address: int):
+        instruction = self._decode_single(address)
+        if self.profiler is None and (instruction.opcode == 7 or instruction.opcode == 8 or instruction.opcode == 9):
+            following = self.memory[address + instruction.size] % 100
+            if following == 5 or following == 6:
+                fused = fuse(instruction, self._decode_single(address + instruction.size))
+                if fused is not None and not (fused.opcode == CompareJumpInstruction.opcode and
+                                              not fused.relative_target and
+                                              address <= fused.target < address + fused.size):
+                    instruction = fused
+        return self.instructions.put(address, address + instruction.size, instruction)
+
+    def _decode_single(self, address: int):
+        type = self.instruction_types.get(self.memory[address] % 100)
+        if type is None:
+            raise Exception(f"Unkown instruction descriptor {self.memory[address]} at position {address}")
+        return type.from_memory(self.state.with_address(address))
 
     def next_instruction(self):
-        for type in self.instruction_types:
-            instruction = type.from_memory(self.state)
-            if instruction:
-                return instruction
-        raise Exception(f"Unkown instruction descriptor {self.state.memory[self.state.address]} at position {self.state.address}")
-
-    def execute(self):
-        while not self.halted:
-            instruction = self.next_instruction()
-            self.state = instruction.execute(self.state)
-            self.halted = isinstance(instruction, HaltInstruction)
+        instruction = self.instructions.get(self.address)
+        instruction = self.decode(self.address) if instruction is None else instruction
+        return instruction.first if isinstance(instruction, FusedInstruction) else instruction
+
+    def _run(self, interrupts, budget=None, timeout=None, until=None) -> ExecutionInterrupt:
+        """`until` is an OutputCondition, without one every output stops when HAS_OUTPUT is in interrupts"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self.profiler is not None:
+            return self.profiler.run(self, interrupts, budget, deadline, until)
+        memory, io, instructions, engine = self.memory, self.io, self.instructions, self.engine
+        address, relative_base = self.address, self.relative_base
+        stop_on_input = ExecutionInterrupt.NEED_INPUT in interrupts
+        stop_on_output = ExecutionInterrupt.HAS_OUTPUT in interrupts or until is not None
+        outputs = io.outputs
+        count, value, predicate = (0, None, None) if until is None else (until.count, until.value, until.predicate)
+        steps = 0
+        limit = sys.maxsize if budget is None else budget
+        check = limit if deadline is None else min(limit, CLOCK_CHECK_STEPS)
+        try:
+            if engine is not None:
+                address, relative_base, executed = engine.enter(memory, address, address, relative_base, check)
+                steps += executed
+            while True:
+                if steps >= check:
+                    if steps >= limit or time.monotonic() >= deadline:
+                        return ExecutionInterrupt.BUDGET_EXHAUSTED
+                    check = min(limit, steps + CLOCK_CHECK_STEPS)
+                instruction = instructions.get(address)
+                if instruction is None:
+                    instruction = self.decode(address)
+                opcode = instruction.opcode
+                steps += 1
+                if opcode == 9:
+                    relative_base += instruction.parameter.load(memory, relative_base)
+                    address += 2
+                    continue
+                if opcode == 99:
+                    self.halted = True
+                    return ExecutionInterrupt.HALT
+                if opcode == 3 and stop_on_input and not io.has_input():  # exit before input instruction to ask for input
+                    steps -= 1
+                    return ExecutionInterrupt.NEED_INPUT
+                if opcode > 99:  # fused pair ending in a jump
+                    if opcode == 101:
+                        relative_base += instruction.parameter.load(memory, relative_base)
+                    next_address = instruction.run(memory, io, address, relative_base)
+                    if next_address == address + 4 and opcode == 100 and instructions.get(address) is not instruction:
+                        # the flag was written into the pair and dropped it, only the compare ran
+                        address = next_address
+                        continue
+                    steps += 1
+                    if engine is not None:
+                        next_address, relative_base, executed = engine.enter(
+                            memory, address + instruction.first.size, next_address, relative_base, check - steps)
+                        steps += executed
+                    address = next_address
+                    continue
+                next_address = instruction.run(memory, io, address, relative_base)
+                if engine is not None and (opcode == 5 or opcode == 6):
+                    next_address, relative_base, executed = engine.enter(memory, address, next_address, relative_base,
+                                                                         check - steps)
+                    steps += executed
+                address = next_address
+                if opcode == 4 and stop_on_output and len(outputs) >= count and \
+                        (value is None or outputs[-1] == value) and (predicate is None or predicate(self)):
+                    return ExecutionInterrupt.HAS_OUTPUT
+        finally:
+            self.address, self.relative_base = address, relative_base
+            self.instruction_count += steps
+
+    def execute(self, budget=None, timeout=None):
+        """Runs to halt, raises BudgetExhausted after `budget` instructions or `timeout` seconds"""
+        if not self.halted:
+            if self._run(set(), budget, timeout) == ExecutionInterrupt.BUDGET_EXHAUSTED:
+                raise BudgetExhausted(f"Program stopped at {self.address} after {self.instruction_count} instructions")
         return self.state
 
-    def execute_until_interrupt(self, interrupts = {ExecutionInterrupt.NEED_INPUT, ExecutionInterrupt.HAS_OUTPUT}):
+    def execute_until_interrupt(self, interrupts = {ExecutionInterrupt.NEED_INPUT, ExecutionInterrupt.HAS_OUTPUT},
+                                budget=None, timeout=None):
+        """Runs until one of the interrupts, halt or until `budget` instructions or `timeout` seconds are used up.
+
+        Budgets are checked between instructions and between compiled blocks, a block may overshoot by its length
+        and a fused instruction pair by one.
+        """
+        return self._run(interrupts, budget, timeout)
+
+    def execute_until(self, outputs: int = 0, value: int = None, predicate=None,
+                      interrupts = {ExecutionInterrupt.NEED_INPUT}, budget=None, timeout=None):
+        """Runs until an output leaves at least `outputs` values buffered in io.outputs, the last of them equal
+        to `value` if given, and `predicate(program)` holds if given; returns HAS_OUTPUT then.
+
+        Count and value are checked in the run loop itself, the predicate only after outputs.
+        Stops early on the other interrupts, halt, budget or timeout like execute_until_interrupt.
+        """
+        return self._run(set(interrupts) - {ExecutionInterrupt.HAS_OUTPUT}, budget, timeout,
+                         OutputCondition(outputs, value, predicate))
+
+    def send_line(self, line: str):
+        """Queues the characters of a line and the newline ending it as input"""
+        self.io.extend([ord(ch) for ch in line] + [10])
+
+    def send_lines(self, lines: [str]):
+        self.io.extend([ord(ch) for line in lines for ch in line + "\n"])
+
+    def read_until_prompt(self, prompt: str = None, budget=None, timeout=None, text_limit: int = 128) -> AsciiOutput:
+        """Runs until the program waits for input, halts or has just printed `prompt`, then takes all buffered
+        output, values below `text_limit` as text and anything else separately"""
+        if prompt:
+            codes = [ord(ch) for ch in prompt]
+
+            def printed_prompt(program) -> bool:
+                # only the tail is compared, the buffer may hold a lot of undrained text
+                outputs = program.io.outputs
+                return len(outputs) >= len(codes) and \
+                    all(outputs[-index] == code for index, code in enumerate(reversed(codes), 1))
+
+            interrupt = self.execute_until(value=codes[-1], budget=budget, timeout=timeout, predicate=printed_prompt)
+        else:
+            interrupt = self.execute_until_interrupt({ExecutionInterrupt.NEED_INPUT}, budget, timeout)
+        text, values = [], []
+        for value in self.io.drain():
+            if 0 <= value < text_limit:
+                text.append(chr(value))
+            else:
+                values.append(value)
+        return AsciiOutput("".join(text), values, interrupt)
+
+    async def run_async(self, in_channel, out_channel):
+        """Runs to halt on asyncio.Queue-style channels.
+
+        Outputs are put on out_channel before the program suspends on in_channel.get() for input,
+        everything already queued is then taken at once, so connected programs only run when they have work.
+        """
         while True:
-            instruction = self.next_instruction()
-            if ExecutionInterrupt.NEED_INPUT in interrupts and isinstance(instruction, InputInstruction) and not self.state.io.inputs: # exit before input instractuon to ask for input
-                return ExecutionInterrupt.NEED_INPUT
-            self.state = instruction.execute(self.state)
-            if ExecutionInterrupt.HAS_OUTPUT in interrupts and isinstance(instruction, OutputInstruction):
-                return ExecutionInterrupt.HAS_OUTPUT
-            if isinstance(instruction, HaltInstruction):
-                self.halted = True
-                return ExecutionInterrupt.HALT
+            interrupt = self._run({ExecutionInterrupt.NEED_INPUT})
+            for value in self.io.drain():
+                await out_channel.put(value)
+            if interrupt == ExecutionInterrupt.HALT:
+                return self.state
+            values = [await in_channel.get()]
+            while not in_channel.empty():
+                values.append(in_channel.get_nowait())
+            self.io.extend(values)
+
+def program_hash(program) -> str:
+    """Content hash of a program image"""
+    return _image_hash(tuple(program))
+
+
+@functools.lru_cache(maxsize=64)
+def _image_hash(program: tuple) -> str:
+    return hashlib.sha256(",".join(str(value) for value in program).encode()).hexdigest()
+
+
+IMAGE_MAGIC = b"ICI1"
+IMAGE_SUFFIX = ".ici"
+
+
+def parse_program(text: str) -> [int]:
+    return [int(s) for s in text.strip().split(',')]
+
+
+def load_program(path: str):
+    """Program from a comma separated input file, an `array('q')` or, when it has values beyond int64, a list.
+
+    Both are mutable sequences of ints that IntcodeProgram and Memory take as they are. The parsed image
+    is kept in a binary file next to the input, `<path>.ici`, with the input's mtime and content hash.
+    Later loads read it straight into an array while the mtime matches or, after a touch, the hash does;
+    the header then takes the new mtime so the next load skips hashing. Programs with values beyond
+    int64 are not cached.
+    """
+    image_path = path + IMAGE_SUFFIX
+    mtime = os.stat(path).st_mtime_ns
+    digest = None
+    try:
+        with open(image_path, "rb") as f:
+            header = f.read(len(IMAGE_MAGIC) + 8 + 32 + 8)
+            if header[:len(IMAGE_MAGIC)] == IMAGE_MAGIC:
+                offset = len(IMAGE_MAGIC)
+                cached_mtime, cached_digest, size = int.from_bytes(header[offset:offset + 8], "little"), \
+                    header[offset + 8:offset + 40], int.from_bytes(header[offset + 40:], "little")
+                if cached_mtime != mtime:
+                    with open(path, "rb") as source:
+                        digest = hashlib.sha256(source.read()).digest()
+                if cached_mtime == mtime or cached_digest == digest:
+                    program = array('q')
+                    program.fromfile(f, size)
+                    if cached_mtime != mtime:
+                        _update_image_mtime(image_path, mtime)
+                    return program
+    except (OSError, EOFError):
+        pass
+    with open(path, "rb") as source:
+        text = source.read()
+    program = parse_program(text.decode())
+    try:
+        image = array('q', program)
+    except OverflowError:
+        return program
+    if PROMOTED in image:
+        return program
+    temporary_path = f"{image_path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_path, "wb") as f:
+            f.write(IMAGE_MAGIC + mtime.to_bytes(8, "little") + hashlib.sha256(text).digest() +
+                    len(image).to_bytes(8, "little"))
+            image.tofile(f)
+        os.replace(temporary_path, image_path)
+    except OSError:
+        pass  # a read-only checkout still gets the parsed program
+    return image
+
+
+def _update_image_mtime(image_path: str, mtime: int):
+    try:
+        with open(image_path, "r+b") as f:
+            f.seek(len(IMAGE_MAGIC))
+            f.write(mtime.to_bytes(8, "little"))
+    except OSError:
+        pass  # a read-only checkout keeps hashing the input
+
+
+def cache_directory() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "aoc2019", "intcode")
+
+
+@dataclass
+class RunResult:
+    outputs: [int]
+    memory: [int]  # the program image area of memory after halt
+    instruction_count: int
+
+
+class ResultCache:
+    """Results of pure runs, programs run to halt on a fixed input vector.
+
+    Keeps the most recently used `capacity` results in memory, with `path` they are also stored in
+    a sqlite database so later processes get them with a lookup. Keys are content hashes of program
+    and inputs. `ResultCache.on_disk()` uses the shared database in the user cache directory.
+    """
+
+    def __init__(self, capacity: int = 1024, path: str = None):
+        self.capacity = capacity
+        self.path = path
+        self.results = OrderedDict()
+        self.connection = None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def on_disk(cls, capacity: int = 1024):
+        return cls(capacity, os.path.join(cache_directory(), "results.sqlite"))
+
+    @staticmethod
+    def key(program, inputs) -> str:
+        inputs = ",".join(str(value) for value in inputs)
+        return hashlib.sha256(f"{program_hash(program)}:{inputs}".encode()).hexdigest()
+
+    def _database(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS results "
+                                    "(key TEXT PRIMARY KEY, outputs TEXT, memory TEXT, instruction_count INTEGER)")
+        return self.connection
+
+    def get(self, key: str):
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+        elif self.path is not None:
+            row = self._database().execute(
+                "SELECT outputs, memory, instruction_count FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                outputs, memory, instruction_count = row
+                result = RunResult([int(value) for value in outputs.split(",") if value],
+                                   [int(value) for value in memory.split(",") if value], instruction_count)
+                self._remember(key, result)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put(self, key: str, result: RunResult):
+        self._remember(key, result)
+        if self.path is not None:
+            with self._database() as connection:
+                connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", (
+                    key, ",".join(str(value) for value in result.outputs),
+                    ",".join(str(value) for value in result.memory), result.instruction_count))
+
+    def _remember(self, key: str, result: RunResult):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.capacity:
+            self.results.popitem(last=False)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+default_result_cache = ResultCache()
+
+
+def run_pure(program, inputs, cache: ResultCache = None, engine=None, budget=None, timeout=None) -> RunResult:
+    """Runs the program to halt on the inputs, or returns the cached result of an earlier identical run.
+
+    Only for programs whose outputs depend on nothing but the program and the inputs, a run that reads
+    more input than given fails like `execute` does. Results are copies, callers may modify them.
+    """
+    cache = default_result_cache if cache is None else cache
+    inputs = list(inputs)
+    key = cache.key(program, inputs)
+    result = cache.get(key)
+    if result is None:
+        run = IntcodeProgram(program, list(inputs), engine=engine)
+        run.execute(budget, timeout)
+        result = RunResult(list(run.io.outputs), run.memory.cells(0, run.memory.image_size), run.instruction_count)
+        cache.put(key, result)
+    return RunResult(list(result.outputs), list(result.memory), result.instruction_count)
+
+
+_batch_program = None
+_batch_engine = None
+
+
+def _start_batch_worker(program, engine):
+    global _batch_program, _batch_engine
+    _batch_program, _batch_engine = program, engine
+
+
+def _run_batch_job(job):
+    inputs, budget, timeout = job
+    try:
+        return IntcodeProgram(_batch_program, list(inputs), engine=_batch_engine).execute(budget, timeout).io.outputs
+    except BudgetExhausted:
+        return None
+
+
+def run_batch(program, input_vectors, max_workers=None, chunksize=16, engine=None, budget=None, timeout=None):
+    """Runs the program to halt once per input vector on a process pool, yields the outputs in input order.
+
+    The program image is sent to each worker once when it starts, jobs only carry their inputs.
+    A run that exceeds `budget` instructions or `timeout` seconds yields None.
+    """
+    jobs = ((inputs, budget, timeout) for inputs in input_vectors)
+    with ProcessPoolExecutor(max_workers, initializer=_start_batch_worker, initargs=(program, engine)) as executor:
+        yield from executor.map(_run_batch_job, jobs, chunksize=chunksize)
+
 
 if __name__ == "__main__":
 
@@ -347,6 +1089,22 @@ if __name__ == "__main__":
     mem[10] = 10
     assert mem[10] == 10
 
+    # far away writes only allocate the page they touch
+    mem[10 ** 9] = 9
+    assert mem[10 ** 9] == 9 and mem[10 ** 9 + 1] == 0 and mem[10 ** 12] == 0
+    assert mem.page_count() == 2
+    assert mem.cells(0, 7) == [0, 1, 22, 3, 4, 5, 6]
+
+    # values beyond int64 are promoted to python ints and survive snapshots
+    mem[3] = 1 << 70
+    mem[10 ** 9] = -(1 << 63)
+    mem[4] = -(1 << 64)
+    mem[4] = 44
+    restored = Memory.restore(mem.snapshot())
+    assert restored[3] == 1 << 70 and restored[10 ** 9] == -(1 << 63) and restored[4] == 44 and restored[2] == 22
+    restored[3] = 33
+    assert mem[3] == 1 << 70 and restored[3] == 33
+
     # input equals to 8 program
     assert IntcodeProgram([3, 9, 8, 9, 10, 9, 4, 9, 99, -1, 8], [8]).execute().io.outputs[-1] == 1
     assert IntcodeProgram([3, 9, 8, 9, 10, 9, 4, 9, 99, -1, 8], [7]).execute().io.outputs[-1] == 0
@@ -375,8 +1133,180 @@ if __name__ == "__main__":
                                                        101, 0, 99]
     assert IntcodeProgram([1102, 34915192, 34915192, 7, 4, 7, 99, 0], []).execute().io.outputs == [1219070632396864]
     assert IntcodeProgram([104, 1125899906842624, 99], []).execute().io.outputs == [1125899906842624]
+    assert IntcodeProgram([1102, 1 << 40, 1 << 40, 7, 4, 7, 99, 0], []).execute().io.outputs == [1 << 80]
+
+    # instructions are abstract over run, the relative base offset only moves its register
+    try:
+        Instruction()
+        assert False
+    except TypeError:
+        pass
+    offset = RelativeBaseOffsetInstruction(Parameter(-3, ParameterMode.IMMEDIATE))
+    assert offset.next_relative_base(Memory([]), 10) == 7
+    assert offset.execute(ProgramState(Memory([]), 0, 10, None)).relative_base == 7
+    try:
+        offset.run(Memory([]), None, 0, 10)
+        assert False
+    except Exception as error:
+        assert "next_relative_base" in str(error)
+
+    # decoded instructions are dropped when the program overwrites them
+    flag_into_jump = [109, 7, 21107, 1, 2, 0, 1205, 0, 20, 104, 0, 99] + [0] * 8 + [104, 1, 99]
+    program = IntcodeProgram(flag_into_jump, [])
+    assert program.execute().io.outputs == [1] and program.instruction_count == 5
+    program = IntcodeProgram(flag_into_jump, [])
+    assert program.execute_until_interrupt(budget=2) == ExecutionInterrupt.BUDGET_EXHAUSTED
+    assert program.instruction_count == 2 and program.address == 6
+    assert IntcodeProgram([104, 1, 1005, 20, 12, 1101, 0, 7, 1, 1105, 1, 13, 99, 1101, 0, 1, 20, 1105, 1, 0, 0],
+                          []).execute().io.outputs == [1, 7]
 
     # program = [int(s) for s in open("day09/input1.txt").read().strip().split(',')]
     # print(IntcodeProgram(program, [1]).execute().io.outputs)
     # print(IntcodeProgram(program, [2]).execute().io.outputs)
+    # registers live outside of ProgramState, the state view reflects them
+    program = IntcodeProgram([109, 5, 3, 0, 204, -5, 99], [])
+    assert program.execute_until_interrupt() == ExecutionInterrupt.NEED_INPUT
+    assert (program.state.address, program.state.relative_base) == (2, 5)
+    program.state.io.inputs.append(42)
+    assert program.execute_until_interrupt() == ExecutionInterrupt.HAS_OUTPUT
+    assert program.state.io.outputs == [42] and program.state.address == 6
+    assert program.execute_until_interrupt() == ExecutionInterrupt.HALT
+
+    # list inputs keep working as the producer side, deques are consumed directly
+    inputs = [1]
+    program = IntcodeProgram([3, 11, 3, 12, 1, 11, 12, 13, 4, 13, 99, 0, 0, 0], inputs)
+    assert program.execute_until_interrupt() == ExecutionInterrupt.NEED_INPUT
+    inputs.append(2)
+    assert program.execute_until_interrupt() == ExecutionInterrupt.HAS_OUTPUT
+    assert program.io.drain() == [3] and program.io.outputs == []
+    program = IntcodeProgram([3, 11, 3, 12, 1, 11, 12, 13, 4, 13, 99, 0, 0, 0], deque([5]))
+    program.io.extend([6, 7])
+    assert program.execute().io.outputs == [11] and list(program.io.inputs) == [7]
+
+    # forks share pages until they write, then run independently
+    program = IntcodeProgram([3, 100, 4, 100, 1105, 1, 0], [])
+    assert program.execute_until_interrupt() == ExecutionInterrupt.NEED_INPUT
+    fork = program.fork()
+    assert fork.memory.dense[0] is program.memory.dense[0]
+    program.io.extend([1])
+    fork.io.extend([2])
+    assert program.execute_until_interrupt() == fork.execute_until_interrupt() == ExecutionInterrupt.HAS_OUTPUT
+    assert program.io.outputs == [1] and fork.io.outputs == [2]
+    assert fork.memory.dense[0] is not program.memory.dense[0]
+    assert program.memory[100] == 1 and fork.memory[100] == 2
+
+    # forking is O(1), only written pages get copied and promoted values stay on their side
+    memory = Memory([0] * (64 * PAGE_SIZE))
+    memory[10 ** 6] = 1
+    forks = [memory.fork() for _ in range(3)]
+    assert all(fork.dense is memory.dense and fork.sparse is memory.sparse for fork in forks)
+    forks[0][5] = 1 << 70
+    forks[0][10 ** 6] = 2
+    forks[0][10 ** 7] = 3
+    assert sum(page is not original for page, original in zip(forks[0].dense, memory.dense)) == 1
+    assert forks[0].owned == {0, 10 ** 6 >> PAGE_BITS, 10 ** 7 >> PAGE_BITS}
+    assert memory[5] == 0 and memory[10 ** 6] == 1 and memory[10 ** 7] == 0 and memory.big == {}
+    assert forks[0][5] == 1 << 70 and forks[1][10 ** 6] == 1 and forks[1].shared_tables
+    memory[5] = 7
+    assert forks[0][5] == 1 << 70 and forks[1][5] == 0 and memory[5] == 7
+
+    # independent runs spread over worker processes keep their order
+    less_than_8 = [3, 9, 7, 9, 10, 9, 4, 9, 99, -1, 8]
+    assert list(run_batch(less_than_8, [[n] for n in range(16)], max_workers=2, chunksize=3)) == \
+           [[1]] * 8 + [[0]] * 8
+
+    # amplifiers in a feedback loop wired with asyncio queues
+    import asyncio
+
+    async def feedback_loop(program, phases):
+        channels = [asyncio.Queue() for _ in phases]
+        for channel, phase in zip(channels, phases):
+            channel.put_nowait(phase)
+        channels[0].put_nowait(0)
+        amplifiers = [IntcodeProgram(program, []) for _ in phases]
+        await asyncio.gather(*[amplifier.run_async(channels[i], channels[(i + 1) % len(phases)])
+                               for i, amplifier in enumerate(amplifiers)])
+        return channels[0].get_nowait()
+
+    assert asyncio.run(feedback_loop([3, 26, 1001, 26, -4, 26, 3, 27, 1002, 27, 2, 27, 1, 27, 26, 27, 4, 27, 1001, 28,
+                                      -1, 28, 1005, 28, 6, 99, 0, 0, 5], [9, 8, 7, 6, 5])) == 139629729
+
+    # budgets and timeouts stop runaway programs, they resume where they stopped
+    countdown = [1101, 1000, 0, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+    program = IntcodeProgram(countdown, [])
+    assert program.execute_until_interrupt(budget=100) == ExecutionInterrupt.BUDGET_EXHAUSTED
+    assert program.instruction_count == 100 and program.memory[100] == 1000 - 50
+    assert program.execute_until_interrupt(budget=2000) == ExecutionInterrupt.HAS_OUTPUT
+    assert program.instruction_count == 2002 and program.io.outputs == [0]
+    forever = IntcodeProgram([1105, 1, 0], [])
+    assert forever.execute_until_interrupt(timeout=0.01) == ExecutionInterrupt.BUDGET_EXHAUSTED
+    try:
+        forever.execute(budget=10)
+        assert False
+    except BudgetExhausted:
+        pass
+    assert list(run_batch([3, 9, 1005, 9, 2, 4, 9, 99, 0, 0], [[0], [1]], budget=1000)) == [[0], None]
+
+    # pure runs are memoized in memory and optionally on disk
+    import tempfile
+    cache = ResultCache(capacity=2, path=os.path.join(tempfile.mkdtemp(), "results.sqlite"))
+    result = run_pure(countdown, [], cache)
+    assert result == RunResult([0], countdown, 2003) and cache.misses == 1
+    assert run_pure([1, 9, 10, 0, 2, 0, 11, 0, 99, 30, 40, 50], []).memory[0] == 3500
+    assert run_pure(countdown, [], cache) == result and cache.hits == 1
+    less_than_8 = [3, 9, 7, 9, 10, 9, 4, 9, 99, -1, 8]
+    assert [run_pure(less_than_8, [n], cache).outputs for n in (7, 8, 9)] == [[1], [0], [0]]
+    assert len(cache.results) == 2
+    cache.close()
+    reopened = ResultCache(path=cache.path)
+    assert reopened.get(ResultCache.key(countdown, [])) == result and reopened.misses == 0
+    assert run_pure([1102, 1 << 40, 1 << 40, 7, 4, 7, 99, 0], [], reopened).outputs == [1 << 80]
+    reopened.close()
+
+    # output conditions stop only once enough outputs are buffered, on a value or when a predicate holds
+    ascii_lines = [104, 65, 104, 10, 104, 66, 104, 67, 104, 10, 99]
+    program = IntcodeProgram(ascii_lines, [])
+    assert program.execute_until(value=10) == ExecutionInterrupt.HAS_OUTPUT and program.io.outputs == [65, 10]
+    assert program.execute_until(outputs=5) == ExecutionInterrupt.HAS_OUTPUT and len(program.io.outputs) == 5
+    assert program.execute_until(outputs=10) == ExecutionInterrupt.HALT
+    program = IntcodeProgram(ascii_lines, [])
+    assert program.execute_until(predicate=lambda p: p.io.outputs[-1] == 67) == ExecutionInterrupt.HAS_OUTPUT
+    assert program.address == 8
+    program = IntcodeProgram([3, 100, 4, 100, 104, 1, 99], [])
+    assert program.execute_until(outputs=2) == ExecutionInterrupt.NEED_INPUT
+    program.io.extend([7])
+    assert program.execute_until(outputs=2) == ExecutionInterrupt.HAS_OUTPUT and program.io.outputs == [7, 1]
+
+    # whole lines in, text and non ASCII values out
+    echo_until_zero = [3, 100, 1006, 100, 10, 4, 100, 1105, 1, 0, 104, 1000000, 104, 62, 104, 32, 99]
+    program = IntcodeProgram(echo_until_zero, [])
+    program.send_lines(["hi", "you"])
+    output = program.read_until_prompt()
+    assert output == AsciiOutput("hi\nyou\n", [], ExecutionInterrupt.NEED_INPUT)
+    program.io.extend([0])
+    assert program.read_until_prompt() == AsciiOutput("> ", [1000000], ExecutionInterrupt.HALT)
+    program = IntcodeProgram(echo_until_zero, [])
+    program.send_line("ab > c")
+    assert program.read_until_prompt("> ") == AsciiOutput("ab > ", [], ExecutionInterrupt.HAS_OUTPUT)
+
+    # program images are parsed once and then loaded from their binary cache
+    directory = tempfile.mkdtemp()
+    source = os.path.join(directory, "input.txt")
+    with open(source, "w") as f:
+        f.write("1102,34915192,34915192,7,4,7,99,0\n")
+    assert load_program(source) == array('q', [1102, 34915192, 34915192, 7, 4, 7, 99, 0])
+    assert os.path.exists(source + IMAGE_SUFFIX)
+    os.utime(source, ns=(10 ** 9, 10 ** 9))
+    assert load_program(source) == array('q', [1102, 34915192, 34915192, 7, 4, 7, 99, 0])
+    with open(source + IMAGE_SUFFIX, "rb") as f:
+        assert f.read(len(IMAGE_MAGIC) + 8)[len(IMAGE_MAGIC):] == (10 ** 9).to_bytes(8, "little")
+    assert IntcodeProgram(load_program(source), []).execute().io.outputs == [1219070632396864]
+    with open(source, "w") as f:
+        f.write("104,1125899906842624,99")
+    os.utime(source, ns=(0, 0))
+    assert list(load_program(source)) == [104, 1125899906842624, 99]
+    with open(source, "w") as f:
+        f.write(f"104,{1 << 70},99")
+    assert load_program(source) == [104, 1 << 70, 99]
+
     print("SUCCESS!")
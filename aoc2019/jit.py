@@ -0,0 +1,195 @@
+from dataclasses import dataclass
+
+from aoc2019.intcode import CodeCache, Memory
+
+HOT_THRESHOLD = 50
+MAX_BLOCK_INSTRUCTIONS = 64
+
+ARITHMETIC_OPCODES = {1: 4, 2: 4, 7: 4, 8: 4, 9: 2}
+JUMP_OPCODES = {5: 3, 6: 3}
+
+
+@dataclass
+class DecodedInstruction:
+    address: int
+    opcode: int
+    parameters: [(int, int)]  # (value, mode) pairs
+
+    @property
+    def end(self):
+        return self.address + len(self.parameters) + 1
+
+    def write_target(self):
+        return self.parameters[2] if self.opcode in (1, 2, 7, 8) else None
+
+
+@dataclass
+class CompiledBlock:
+    start: int
+    end: int
+    exit: int  # address of the last instruction, the jump leaving the block
+    source: str
+    function: object
+
+
+def decode_straight_line(memory: Memory, start: int, max_instructions: int = MAX_BLOCK_INSTRUCTIONS):
+    """Decodes arithmetic instructions from start up to and including the first jump.
+
+    Stops before IO, halt or anything that does not decode cleanly so the interpreter handles it.
+    """
+    instructions = []
+    address = start
+    while len(instructions) < max_instructions:
+        value = memory[address]
+        opcode = value % 100
+        size = ARITHMETIC_OPCODES.get(opcode) or JUMP_OPCODES.get(opcode)
+        if size is None:
+            break
+        modes = [value // 10 ** (order + 1) % 10 for order in range(1, size)]
+        if any(mode not in (0, 1, 2) for mode in modes):
+            break
+        instruction = DecodedInstruction(address, opcode,
+                                         [(memory[address + order], mode) for order, mode in enumerate(modes, 1)])
+        target = instruction.write_target()
+        if target is not None and target[1] == 1:
+            break
+        instructions.append(instruction)
+        address = instruction.end
+        if opcode in JUMP_OPCODES:
+            break
+    # a position mode write into the block itself ends the block right after that write
+    for index, instruction in enumerate(instructions):
+        target = instruction.write_target()
+        if target is not None and target[1] == 0 and start <= target[0] < instructions[-1].end:
+            return instructions[:index + 1]
+    return instructions
+
+
+def operand(parameter: (int, int)) -> str:
+    value, mode = parameter
+    if mode == 0:
+        return f"memory[{value}]"
+    elif mode == 1:
+        return str(value)
+    else:
+        return f"memory[relative_base + {value}]"
+
+
+def generate_block_source(name: str, instructions: [DecodedInstruction]) -> str:
+    start, end = instructions[0].address, instructions[-1].end
+    lines = [f"def {name}(memory, relative_base):"]
+    count = len(instructions)
+    for index, instruction in enumerate(instructions, 1):
+        opcode, parameters = instruction.opcode, instruction.parameters
+        lines.append(f"    # {instruction.address}: {opcode} {parameters}")
+        if opcode == 9:
+            lines.append(f"    relative_base += {operand(parameters[0])}")
+        elif opcode == 5:
+            lines.append(f"    if {operand(parameters[0])} > 0:")
+            lines.append(f"        return {operand(parameters[1])}, relative_base, {count}")
+        elif opcode == 6:
+            lines.append(f"    if {operand(parameters[0])} == 0:")
+            lines.append(f"        return {operand(parameters[1])}, relative_base, {count}")
+        else:
+            a, b = operand(parameters[0]), operand(parameters[1])
+            expression = {
+                1: f"{a} + {b}",
+                2: f"{a} * {b}",
+                7: f"1 if {a} < {b} else 0",
+                8: f"1 if {a} == {b} else 0",
+            }[opcode]
+            value, mode = parameters[2]
+            if mode == 0:
+                lines.append(f"    memory[{value}] = {expression}")
+            else:
+                # the target is only known at run time, leave the block if it rewrote itself
+                lines.append(f"    target = relative_base + {value}")
+                lines.append(f"    memory[target] = {expression}")
+                lines.append(f"    if {start} <= target < {end}:")
+                lines.append(f"        return {instruction.end}, relative_base, {index}")
+    lines.append(f"    return {end}, relative_base, {count}")
+    return "\n".join(lines) + "\n"
+
+
+def compile_block(memory: Memory, start: int):
+    instructions = decode_straight_line(memory, start)
+    if not instructions:
+        return None
+    name = f"block_{start}"
+    source = generate_block_source(name, instructions)
+    namespace = {}
+    exec(compile(source, f"<intcode {name}>", "exec"), namespace)
+    return CompiledBlock(start, instructions[-1].end, instructions[-1].address, source, namespace[name])
+
+
+class TraceJit:
+    """Compiles hot loop bodies into Python functions.
+
+    IntcodeProgram calls `enter` after every jump with the number of instructions it may still run,
+    blocks return how many they executed and no further block is entered once that is used up.
+    Targets of backward jumps are counted and once a target gets hot the straight-line block starting
+    there is compiled. Compiled blocks live in a CodeCache, so a write into a block drops it and the
+    interpreter takes over again.
+    """
+
+    def __init__(self, memory: Memory, threshold: int = HOT_THRESHOLD):
+        self.blocks = CodeCache(memory)
+        self.threshold = threshold
+        self.heat = {}
+
+    def warm_up(self, memory: Memory, address: int):
+        heat = self.heat.get(address, 0) + 1
+        if heat < self.threshold:
+            self.heat[address] = heat
+            return None
+        self.heat[address] = 0
+        block = compile_block(memory, address)
+        return None if block is None else self.blocks.put(block.start, block.end, block)
+
+    def enter(self, memory: Memory, origin: int, address: int, relative_base: int, budget: int):
+        blocks = self.blocks
+        executed = 0
+        while executed < budget:
+            block = blocks.get(address)
+            if block is None:
+                if address >= origin:
+                    break
+                block = self.warm_up(memory, address)
+                if block is None:
+                    break
+            origin = block.exit
+            address, relative_base, count = block.function(memory, relative_base)
+            executed += count
+        return address, relative_base, executed
+
+
+if __name__ == "__main__":
+    from aoc2019.intcode import ExecutionInterrupt, IntcodeProgram
+
+    # count down from 1000 in a loop, the loop body gets compiled
+    countdown = [1101, 1000, 0, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+    program = IntcodeProgram(countdown, [], engine=TraceJit)
+    assert program.execute().io.outputs == [0]
+    assert program.engine.blocks.get(4).source.startswith("def block_4")
+
+    # a compiled loop that rewrites its own increment is dropped and recompiled
+    self_modifying = [1101, 0, 0, 100, 1001, 100, 1, 100, 1008, 100, 60, 101, 1006, 101, 24, 1101, 0, 2, 6,
+                      1105, 1, 4, 0, 0, 1007, 100, 200, 101, 1005, 101, 4, 4, 100, 99]
+    assert IntcodeProgram(self_modifying, [], engine=TraceJit).execute().io.outputs == \
+           IntcodeProgram(self_modifying, []).execute().io.outputs == [200]
+
+    # relative mode writes into the running block leave it immediately
+    relative = [109, 7, 1101, 0, 0, 100, 21101, 0, 2, 0, 1001, 100, 1, 100, 1007, 100, 80, 101, 1005, 101, 6, 4, 100, 99]
+    assert IntcodeProgram(relative, [], engine=TraceJit).execute().io.outputs == \
+           IntcodeProgram(relative, []).execute().io.outputs
+
+    # compiled blocks count their instructions against the budget
+    program = IntcodeProgram(countdown, [], engine=TraceJit)
+    assert program.execute_until_interrupt(budget=500) == ExecutionInterrupt.BUDGET_EXHAUSTED
+    assert 500 <= program.instruction_count < 500 + MAX_BLOCK_INSTRUCTIONS
+    program.execute()
+    assert program.io.outputs == [0] and program.instruction_count == 2003
+
+    # program = [int(s) for s in open("day09/input1.txt").read().strip().split(',')]
+    # print(IntcodeProgram(program, [2], engine=TraceJit).execute().io.outputs)
+    print("SUCCESS!")
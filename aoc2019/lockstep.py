@@ -0,0 +1,182 @@
+import numpy as np
+
+from aoc2019.intcode import IntcodeProgram
+
+INT64_LIMIT = 1 << 62  # products of operands below this magnitude can not overflow int64 sums either
+
+
+def large(values):
+    """Values of at least INT64_LIMIT in magnitude, np.abs would wrap on the int64 minimum"""
+    return (values >= INT64_LIMIT) | (values <= -INT64_LIMIT)
+
+
+class LockstepIntcode:
+    """Runs many instances of one Intcode program with different inputs as rows of an int64 array.
+
+    Every step gathers the current instruction of all running rows and executes each opcode group
+    with NumPy masks, so rows at different addresses still advance together. A row that reads or
+    writes outside of its memory row, could overflow int64, runs out of inputs or hits an unknown
+    instruction or parameter mode is marked for fallback and rerun from scratch on the scalar
+    IntcodeProgram, which promotes to big ints and raises where the VM does. Images and inputs
+    with values beyond int64 run there from the start.
+    """
+
+    def __init__(self, program, input_vectors, memory_size=None, engine=None):
+        self.program = program
+        self.input_vectors = [list(inputs) for inputs in input_vectors]
+        self.engine = engine
+        count = len(self.input_vectors)
+        width = max(memory_size or 2 * len(program), len(program) + 4)
+        self.halted = np.zeros(count, dtype=bool)
+        self.fallback = np.zeros(count, dtype=bool)
+        self.memory = np.zeros((count, width), dtype=np.int64)
+        try:
+            self.memory[:, :len(program)] = np.array(program, dtype=np.int64)
+        except OverflowError:
+            self.fallback[:] = True
+        self.address = np.zeros(count, dtype=np.int64)
+        self.relative_base = np.zeros(count, dtype=np.int64)
+        input_width = max([len(inputs) for inputs in self.input_vectors] + [1])
+        self.inputs = np.zeros((count, input_width), dtype=np.int64)
+        for row, inputs in enumerate(self.input_vectors):
+            try:
+                self.inputs[row, :len(inputs)] = inputs
+            except OverflowError:
+                self.fallback[row] = True
+        self.input_count = np.array([len(inputs) for inputs in self.input_vectors], dtype=np.int64)
+        self.input_position = np.zeros(count, dtype=np.int64)
+        self.outputs = [[] for _ in range(count)]
+
+    def _addresses(self, rows, raw, mode):
+        with np.errstate(over="ignore"):
+            return np.where(mode == 2, raw + self.relative_base[rows], raw)
+
+    def _outside(self, addresses, raw, mode):
+        """Addresses outside of the memory rows, relative ones with a raw value large enough to wrap included"""
+        return (addresses < 0) | (addresses >= self.memory.shape[1]) | ((mode == 2) & large(raw))
+
+    def _load(self, rows, raw, mode, used):
+        """Parameter values for the rows, marks rows whose used parameter points outside of memory"""
+        addresses = self._addresses(rows, raw, mode)
+        width = self.memory.shape[1]
+        outside = used & (mode != 1) & self._outside(addresses, raw, mode)
+        values = np.where(mode == 1, raw, self.memory[rows, np.clip(addresses, 0, width - 1)])
+        return values, outside
+
+    def step(self):
+        rows = np.nonzero(~(self.halted | self.fallback))[0]
+        if len(rows) == 0:
+            return False
+        width = self.memory.shape[1]
+        address = self.address[rows]
+        outside = (address < 0) | (address + 3 >= width)
+        fetch = np.clip(address, 0, width - 4)
+        instruction = self.memory[rows, fetch]
+        opcode = instruction % 100
+        modes = [instruction // 100 % 10, instruction // 1000 % 10, instruction // 10000 % 10]
+        raw = [self.memory[rows, fetch + order] for order in (1, 2, 3)]
+
+        binary = np.isin(opcode, (1, 2, 7, 8))
+        jump = np.isin(opcode, (5, 6))
+        value1, outside1 = self._load(rows, raw[0], modes[0], binary | jump | (opcode == 4) | (opcode == 9))
+        value2, outside2 = self._load(rows, raw[1], modes[1], binary | jump)
+        target = self._addresses(rows, raw[2], modes[2])
+        outside3 = binary & ((modes[2] == 1) | self._outside(target, raw[2], modes[2]))
+        input_target = self._addresses(rows, raw[0], modes[0])
+        reading = opcode == 3
+        outside_input = reading & ((modes[0] == 1) | self._outside(input_target, raw[0], modes[0]))
+        starving = reading & (self.input_position[rows] >= self.input_count[rows])
+        unary = np.isin(opcode, (3, 4, 9))
+        unknown = ~(binary | jump | unary | (opcode == 99))
+        # the VM decodes a mode for every parameter of the instruction and raises on anything but 0, 1 and 2
+        arity = np.select([binary, jump, unary], [3, 2, 1], 0)
+        unknown |= ((arity >= 1) & (modes[0] > 2)) | ((arity >= 2) & (modes[1] > 2)) | ((arity >= 3) & (modes[2] > 2))
+
+        with np.errstate(over="ignore"):
+            product = value1 * value2
+            total = value1 + value2
+            moved = self.relative_base[rows] + value1
+        # relative bases stay below INT64_LIMIT as well, so relative addresses of small raw values can not wrap
+        overflow = ((opcode == 1) & (large(value1) | large(value2))) | \
+                   ((opcode == 2) & (np.abs(value1.astype(float) * value2.astype(float)) >= INT64_LIMIT)) | \
+                   ((opcode == 9) & (large(value1) | large(moved)))
+
+        failed = outside | outside1 | outside2 | outside3 | outside_input | starving | unknown | overflow
+        self.fallback[rows[failed]] = True
+        running = ~failed
+
+        result = np.select([opcode == 1, opcode == 2, opcode == 7, opcode == 8],
+                           [total, product, (value1 < value2).astype(np.int64), (value1 == value2).astype(np.int64)])
+        writing = running & binary
+        self.memory[rows[writing], target[writing]] = result[writing]
+
+        reading &= running
+        read_rows = rows[reading]
+        self.memory[read_rows, input_target[reading]] = self.inputs[read_rows, self.input_position[read_rows]]
+        self.input_position[read_rows] += 1
+
+        writing_output = running & (opcode == 4)
+        for row, value in zip(rows[writing_output], value1[writing_output]):
+            self.outputs[row].append(int(value))
+
+        moving = running & (opcode == 9)
+        self.relative_base[rows[moving]] += value1[moving]
+
+        self.halted[rows[running & (opcode == 99)]] = True
+
+        sizes = np.select([binary, jump, reading | writing_output | moving], [4, 3, 2], 0)
+        taken = ((opcode == 5) & (value1 > 0)) | ((opcode == 6) & (value1 == 0))
+        next_address = np.where(taken, value2, address + sizes)
+        self.address[rows[running]] = next_address[running]
+        return True
+
+    def run(self):
+        while self.step():
+            pass
+        for row in np.nonzero(self.fallback)[0]:
+            program = IntcodeProgram(self.program, list(self.input_vectors[row]), engine=self.engine)
+            self.outputs[row] = program.execute().io.outputs
+        return self.outputs
+
+
+def run_lockstep(program, input_vectors, batch_size=4096, memory_size=None, engine=None):
+    """Outputs of running the program to halt once per input vector, in input order"""
+    input_vectors = list(input_vectors)
+    outputs = []
+    for start in range(0, len(input_vectors), batch_size):
+        batch = input_vectors[start:start + batch_size]
+        outputs.extend(LockstepIntcode(program, batch, memory_size, engine).run())
+    return outputs
+
+
+if __name__ == "__main__":
+    less_than_8 = [3, 9, 7, 9, 10, 9, 4, 9, 99, -1, 8]
+    assert run_lockstep(less_than_8, [[n] for n in range(16)], batch_size=5) == [[1]] * 8 + [[0]] * 8
+
+    # rows take different jumps and still advance together
+    jumps = [3, 12, 6, 12, 15, 1, 13, 14, 13, 4, 13, 99, -1, 0, 1, 9]
+    assert run_lockstep(jumps, [[0], [10], [0]]) == [[0], [1], [0]]
+
+    quine = [109, 1, 204, -1, 1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99]
+    assert run_lockstep(quine, [[]] * 3, memory_size=128) == [quine] * 3
+
+    # overflowing int64 and addresses beyond the memory row fall back to the scalar VM
+    assert run_lockstep([1102, 1 << 40, 1 << 40, 7, 4, 7, 99, 0], [[], []]) == [[1 << 80]] * 2
+    assert run_lockstep(quine, [[]]) == [quine]
+    assert run_lockstep([1101, -(1 << 63), -1, 7, 4, 7, 99, 0], [[]]) == [[-(1 << 63) - 1]]
+    assert run_lockstep([109, 1 << 62, 109, 1 << 62, 204, 7 - (1 << 63), 99, 42], [[]]) == [[42]]
+
+    # images and inputs beyond int64 run on the scalar VM from the start
+    assert run_lockstep([104, 1 << 70, 99], [[], []]) == [[1 << 70]] * 2
+    assert run_lockstep(less_than_8, [[1 << 70], [3]]) == [[0], [1]]
+
+    # unknown parameter modes raise like they do on the VM
+    try:
+        run_lockstep([304, 3, 99], [[]])
+        assert False
+    except ValueError:
+        pass
+
+    # program = [int(s) for s in open("day19/input1.txt").read().strip().split(',')]
+    # print(sum(out[0] for out in run_lockstep(program, [[x, y] for y in range(50) for x in range(50)])))
+    print("SUCCESS!")
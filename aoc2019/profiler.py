@@ -0,0 +1,123 @@
+import json
+import time
+from collections import Counter
+
+from aoc2019.intcode import ExecutionInterrupt, IntcodeProgram
+
+
+class Profiler:
+    """Per-opcode and per-address execution profile of an IntcodeProgram.
+
+    Attach with `IntcodeProgram(..., profiler=Profiler())`. While attached the program runs this
+    instrumented copy of the run loop, without an engine so every instruction is counted; a program
+    without a profiler never touches this code.
+    """
+
+    def __init__(self):
+        self.opcodes = Counter()
+        self.addresses = Counter()
+        self.handler_time = Counter()
+        self.loops = Counter()  # (target, origin) of backward jumps
+        self.names = {}
+
+    def run(self, program: IntcodeProgram, interrupts, budget=None, deadline=None, until=None) -> ExecutionInterrupt:
+        memory, io = program.memory, program.io
+        address, relative_base = program.address, program.relative_base
+        stop_on_input = ExecutionInterrupt.NEED_INPUT in interrupts
+        stop_on_output = ExecutionInterrupt.HAS_OUTPUT in interrupts or until is not None
+        clock = time.perf_counter
+        steps = 0
+        try:
+            while True:
+                if (budget is not None and steps >= budget) or (deadline is not None and time.monotonic() >= deadline):
+                    return ExecutionInterrupt.BUDGET_EXHAUSTED
+                instruction = program.instructions.get(address)
+                if instruction is None:
+                    instruction = program.decode(address)
+                opcode = instruction.opcode
+                if opcode == 99:
+                    steps += 1
+                    self.count(address, instruction, 0.0)
+                    program.halted = True
+                    return ExecutionInterrupt.HALT
+                if opcode == 3 and stop_on_input and not io.has_input():
+                    return ExecutionInterrupt.NEED_INPUT
+                steps += 1
+                started = clock()
+                if opcode == 9:
+                    relative_base = instruction.next_relative_base(memory, relative_base)
+                    next_address = address + 2
+                else:
+                    next_address = instruction.run(memory, io, address, relative_base)
+                self.count(address, instruction, clock() - started)
+                if next_address <= address:
+                    self.loops[(next_address, address)] += 1
+                address = next_address
+                if opcode == 4 and stop_on_output and (until is None or until.holds(program)):
+                    return ExecutionInterrupt.HAS_OUTPUT
+        finally:
+            program.address, program.relative_base = address, relative_base
+            program.instruction_count += steps
+
+    def count(self, address: int, instruction, elapsed: float):
+        self.opcodes[instruction.opcode] += 1
+        self.addresses[address] += 1
+        self.handler_time[instruction.opcode] += elapsed
+        self.names[instruction.opcode] = type(instruction).__name__
+
+    def to_json(self, top: int = 20) -> dict:
+        return {
+            "instructions": sum(self.opcodes.values()),
+            "opcodes": [
+                {"opcode": opcode, "name": self.names[opcode], "count": count, "seconds": self.handler_time[opcode]}
+                for opcode, count in self.opcodes.most_common()
+            ],
+            "addresses": [{"address": address, "count": count} for address, count in self.addresses.most_common(top)],
+            "loops": [{"target": target, "origin": origin, "count": count}
+                      for (target, origin), count in self.loops.most_common(top)],
+        }
+
+    def dump(self, path: str, top: int = 20):
+        with open(path, "w") as f:
+            json.dump(self.to_json(top), f, indent=2)
+
+    def report(self, top: int = 10) -> str:
+        profile = self.to_json(top)
+        lines = [f"{profile['instructions']} instructions", "", f"{'opcode':<33}{'count':>10} {'seconds':>10}"]
+        for entry in profile["opcodes"]:
+            lines.append(f"{entry['opcode']:>2} {entry['name']:<30}{entry['count']:>10} {entry['seconds']:>10.4f}")
+        lines += ["", "address     count"]
+        lines += [f"{entry['address']:>7} {entry['count']:>9}" for entry in profile["addresses"]]
+        lines += ["", "loop (target <- origin)     count"]
+        lines += [f"{entry['target']:>7} <- {entry['origin']:<7} {entry['count']:>13}" for entry in profile["loops"]]
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    countdown = [1101, 10, 0, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+    profiler = Profiler()
+    assert IntcodeProgram(countdown, [], profiler=profiler).execute().io.outputs == [0]
+    profile = profiler.to_json()
+    assert profile["instructions"] == 1 + 10 * 2 + 1 + 1
+    assert {entry["opcode"]: entry["count"] for entry in profile["opcodes"]} == {1: 11, 5: 10, 4: 1, 99: 1}
+    assert profile["addresses"][0]["count"] == 10
+    assert profile["loops"] == [{"target": 4, "origin": 8, "count": 9}]
+
+    program = IntcodeProgram([3, 100, 4, 100, 99], [], profiler=Profiler())
+    assert program.execute_until_interrupt() == ExecutionInterrupt.NEED_INPUT
+    program.io.extend([7])
+    assert program.execute_until_interrupt() == ExecutionInterrupt.HAS_OUTPUT and program.io.outputs == [7]
+    assert program.execute_until_interrupt() == ExecutionInterrupt.HALT
+
+    program = IntcodeProgram(countdown, [], profiler=Profiler())
+    assert program.execute_until_interrupt(budget=5) == ExecutionInterrupt.BUDGET_EXHAUSTED
+    assert program.instruction_count == sum(program.profiler.opcodes.values()) == 5
+
+    program = IntcodeProgram([104, 1, 104, 2, 104, 3, 99], [], profiler=Profiler())
+    assert program.execute_until(outputs=2) == ExecutionInterrupt.HAS_OUTPUT and program.io.outputs == [1, 2]
+
+    # program = [int(s) for s in open("day09/input1.txt").read().strip().split(',')]
+    # profiler = Profiler()
+    # IntcodeProgram(program, [2], profiler=profiler).execute()
+    # print(profiler.report())
+    print("SUCCESS!")
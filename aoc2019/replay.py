@@ -0,0 +1,301 @@
+import hashlib
+from dataclasses import dataclass
+
+from aoc2019.intcode import IO, ExecutionInterrupt, IntcodeProgram, Memory, MemorySnapshot, ProgramState, \
+    program_hash
+
+MAGIC = b"ICR2"
+NO_SCRIPT = bytes(32)  # script digest of sessions recorded without one
+INPUT = 1
+OUTPUT = 2
+CHECKPOINT = 3
+
+
+def write_int(out: bytearray, value: int):
+    """Zigzag varint, any python int fits"""
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def script_hash(lines: [str]) -> bytes:
+    """Digest of the input lines a session was recorded for"""
+    return hashlib.sha256("\n".join(lines).encode()).digest()
+
+
+def write_bytes(out: bytearray, data: bytes):
+    write_int(out, len(data))
+    out.extend(data)
+
+
+class Reader:
+    def __init__(self, data: bytes, position: int = 0):
+        self.data = data
+        self.position = position
+
+    def at_end(self) -> bool:
+        return self.position >= len(self.data)
+
+    def byte(self) -> int:
+        self.position += 1
+        return self.data[self.position - 1]
+
+    def int(self) -> int:
+        value, shift = 0, 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+    def bytes(self) -> bytes:
+        length = self.int()
+        self.position += length
+        return self.data[self.position - length:self.position]
+
+
+@dataclass
+class Checkpoint:
+    input_count: int
+    output_count: int
+    address: int
+    relative_base: int
+    halted: bool
+    pending: [int]
+    snapshot: MemorySnapshot
+
+    def write(self, out: bytearray):
+        for value in (self.input_count, self.output_count, self.address, self.relative_base, int(self.halted)):
+            write_int(out, value)
+        write_int(out, len(self.pending))
+        for value in self.pending:
+            write_int(out, value)
+        write_int(out, self.snapshot.image_size)
+        write_bytes(out, self.snapshot.dense)
+        write_int(out, len(self.snapshot.sparse))
+        for index, page in self.snapshot.sparse.items():
+            write_int(out, index)
+            write_bytes(out, page)
+        write_int(out, len(self.snapshot.big))
+        for address, value in self.snapshot.big.items():
+            write_int(out, address)
+            write_int(out, value)
+
+    @classmethod
+    def read(cls, reader: Reader):
+        input_count, output_count, address, relative_base, halted = [reader.int() for _ in range(5)]
+        pending = [reader.int() for _ in range(reader.int())]
+        image_size = reader.int()
+        dense = reader.bytes()
+        sparse = {}
+        for _ in range(reader.int()):
+            index = reader.int()
+            sparse[index] = reader.bytes()
+        big = {}
+        for _ in range(reader.int()):
+            big_address = reader.int()
+            big[big_address] = reader.int()
+        return cls(input_count, output_count, address, relative_base, bool(halted), pending,
+                   MemorySnapshot(image_size, dense, sparse, big))
+
+
+class RecordingIO(IO):
+    def __init__(self, io: IO, recorder):
+        super().__init__(io.inputs, io.outputs)
+        self.buffer = io.buffer
+        self.recorder = recorder
+
+    def read(self):
+        value = super().read()
+        self.recorder.record(INPUT, value)
+        return value
+
+    def write(self, value: int):
+        super().write(value)
+        self.recorder.record(OUTPUT, value)
+
+
+class Recorder:
+    """Records the IO stream of a program into a compact binary session log.
+
+    Checkpoints of memory and registers are taken when recording starts, every `checkpoint_every`
+    consumed inputs when the program is run through the recorder, and always when the log is saved,
+    so `replay` restores the final state without running the session again. With `script`, the input
+    lines driving the session, its digest goes into the header and only a replay of the same script
+    accepts the log. `stop` puts the program's own IO back once the session is over.
+    """
+
+    def __init__(self, program: IntcodeProgram, checkpoint_every: int = 64, script: [str] = None):
+        self.program = program
+        self.checkpoint_every = checkpoint_every
+        self.log = bytearray(MAGIC)
+        self.log.extend(bytes.fromhex(program_hash(program.image)))
+        self.log.extend(NO_SCRIPT if script is None else script_hash(script))
+        self.io = program.io
+        self.input_count = 0
+        self.output_count = 0
+        self.checkpoint_input_count = 0
+        program.io = RecordingIO(program.io, self)
+        self.checkpoint()
+
+    def record(self, tag: int, value: int):
+        self.log.append(tag)
+        write_int(self.log, value)
+        if tag == INPUT:
+            self.input_count += 1
+        else:
+            self.output_count += 1
+
+    def checkpoint(self):
+        program = self.program
+        self.log.append(CHECKPOINT)
+        Checkpoint(self.input_count, self.output_count, program.address, program.relative_base, program.halted,
+                   program.io.pending(), program.memory.snapshot()).write(self.log)
+        self.checkpoint_input_count = self.input_count
+
+    def execute_until_interrupt(self, interrupts = {ExecutionInterrupt.NEED_INPUT, ExecutionInterrupt.HAS_OUTPUT}):
+        result = self.program.execute_until_interrupt(interrupts)
+        if self.input_count - self.checkpoint_input_count >= self.checkpoint_every:
+            self.checkpoint()
+        return result
+
+    def execute(self):
+        state = self.program.execute()
+        self.checkpoint()
+        return state
+
+    def to_bytes(self) -> bytes:
+        self.checkpoint()
+        return bytes(self.log)
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    def stop(self):
+        """Stops recording, later IO of the program is no longer logged"""
+        if isinstance(self.program.io, RecordingIO) and self.program.io.recorder is self:
+            self.program.io = self.io
+
+
+@dataclass
+class Session:
+    inputs: [int]
+    outputs: [int]
+    checkpoint: Checkpoint
+
+
+def recorded_for(program, data: bytes, script: [str] = None) -> bool:
+    """Whether the session log was recorded for the program and, if given, the script"""
+    return data[:len(MAGIC)] == MAGIC and \
+        data[len(MAGIC):len(MAGIC) + 32] == bytes.fromhex(program_hash(program)) and \
+        (script is None or data[len(MAGIC) + 32:len(MAGIC) + 64] == script_hash(script))
+
+
+def read_session(program, data: bytes, script: [str] = None) -> Session:
+    if data[:len(MAGIC)] != MAGIC:
+        raise Exception("Not an Intcode session log")
+    reader = Reader(data, len(MAGIC) + 64)
+    if data[len(MAGIC):len(MAGIC) + 32] != bytes.fromhex(program_hash(program)):
+        raise Exception("Session log was recorded for a different program")
+    if not recorded_for(program, data, script):
+        raise Exception("Session log was recorded for a different script")
+    inputs, outputs, checkpoint = [], [], None
+    while not reader.at_end():
+        tag = reader.byte()
+        if tag == INPUT:
+            inputs.append(reader.int())
+        elif tag == OUTPUT:
+            outputs.append(reader.int())
+        elif tag == CHECKPOINT:
+            checkpoint = Checkpoint.read(reader)
+        else:
+            raise Exception(f"Unknown session log record {tag}")
+    return Session(inputs, outputs, checkpoint)
+
+
+def replay(program, data: bytes, inputs=None, outputs=None, engine=None, script: [str] = None) -> IntcodeProgram:
+    """Program in the state at the end of the recorded session.
+
+    Restores the last checkpoint and feeds whatever was consumed after it in one go; outputs
+    produced while fast-forwarding must match the recording. `script` has to match the recorded one.
+    """
+    session = read_session(program, data, script)
+    restored = IntcodeProgram(program, [] if inputs is None else inputs, outputs, engine=engine)
+    checkpoint = session.checkpoint
+    input_count, output_count = 0, 0
+    if checkpoint is not None:
+        restored.state = ProgramState(Memory.restore(checkpoint.snapshot), checkpoint.address,
+                                      checkpoint.relative_base, restored.io)
+        restored.halted = checkpoint.halted
+        input_count, output_count = checkpoint.input_count, checkpoint.output_count
+    remaining = session.inputs[input_count:]
+    if remaining:
+        restored.io.extend(remaining)
+        produced_before = len(restored.io.outputs)
+        restored.execute_until_interrupt({ExecutionInterrupt.NEED_INPUT})
+        if list(restored.io.outputs)[produced_before:] != session.outputs[output_count:]:
+            raise Exception("Replay diverged from the recorded session")
+    if checkpoint is not None:
+        # inputs pending at the checkpoint and consumed later are part of remaining already
+        restored.io.extend(checkpoint.pending[len(remaining):])
+    return restored
+
+
+if __name__ == "__main__":
+    echo_sum = [3, 100, 1, 100, 101, 101, 4, 101, 1105, 1, 0]
+    program = IntcodeProgram(echo_sum, [])
+    recorder = Recorder(program, checkpoint_every=3)
+    for value in [5, -7, 1 << 70, 9]:
+        program.io.extend([value])
+        while recorder.execute_until_interrupt() == ExecutionInterrupt.HAS_OUTPUT:
+            pass
+    data = recorder.to_bytes()
+    assert program.io.outputs == [5, -2, (1 << 70) - 2, (1 << 70) + 7]
+
+    restored = replay(echo_sum, data)
+    assert (restored.address, restored.relative_base) == (program.address, program.relative_base)
+    assert restored.memory[101] == (1 << 70) + 7 and restored.io.outputs == []
+    restored.io.extend([1])
+    assert restored.execute_until_interrupt() == ExecutionInterrupt.HAS_OUTPUT
+    assert restored.io.outputs == [(1 << 70) + 8]
+
+    session = read_session(echo_sum, data)
+    assert session.inputs == [5, -7, 1 << 70, 9] and session.outputs == program.io.outputs
+
+    # without later checkpoints the session is fast-forwarded from the one taken when recording started
+    program = IntcodeProgram(echo_sum, [5])
+    program.execute_until_interrupt({ExecutionInterrupt.NEED_INPUT})
+    recorder = Recorder(program, checkpoint_every=100)
+    program.io.extend([-7, 1 << 70, 9])
+    recorder.execute_until_interrupt({ExecutionInterrupt.NEED_INPUT})
+    fast_forwarded = replay(echo_sum, bytes(recorder.log))
+    assert fast_forwarded.memory[101] == (1 << 70) + 7 and fast_forwarded.address == program.address
+    assert fast_forwarded.io.outputs == program.io.outputs[1:]
+
+    # after stop the program runs on its own IO again and the log stays as it was
+    recorder.stop()
+    size = len(recorder.log)
+    program.io.extend([1])
+    assert program.execute_until_interrupt() == ExecutionInterrupt.HAS_OUTPUT
+    assert type(program.io) is IO and len(recorder.log) == size and program.io.outputs[-1] == (1 << 70) + 8
+
+    # a session recorded for a script is only replayed for that script
+    program = IntcodeProgram(echo_sum, [])
+    recorder = Recorder(program, script=["5", "9"])
+    program.io.extend([5, 9])
+    recorder.execute_until_interrupt({ExecutionInterrupt.NEED_INPUT})
+    data = recorder.to_bytes()
+    assert recorded_for(echo_sum, data, ["5", "9"]) and not recorded_for(echo_sum, data, ["5"])
+    assert recorded_for(echo_sum, data) and not recorded_for(echo_sum[:-1], data, ["5", "9"])
+    assert replay(echo_sum, data, script=["5", "9"]).memory[101] == 14
+    try:
+        replay(echo_sum, data, script=["5"])
+        assert False
+    except Exception as error:
+        assert "different script" in str(error)
+
+    print("SUCCESS!")
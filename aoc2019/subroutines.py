@@ -0,0 +1,337 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from aoc2019.intcode import Memory
+
+CALL_THRESHOLD = 16  # calls of a subroutine before they get traced
+MEMO_CAPACITY = 1 << 15  # recorded cells kept over all entries
+BUCKET_SIZE = 8  # entries kept per argument signature
+MAX_ENTRY_CELLS = 1024  # calls touching more cells are run but not remembered
+MAX_COOLDOWN = 1024  # calls an impure subroutine is left untraced for at most
+
+ARB_IMMEDIATE = 109
+OPERAND_COUNTS = {1: 3, 2: 3, 5: 2, 6: 2, 7: 3, 8: 3, 9: 1}
+
+
+@dataclass
+class MemoEntry:
+    """Effect of one call, cells are (relative, key, value) with key an offset from the call's relative base
+    for cells accessed in relative mode and an address otherwise, code included"""
+    inputs: tuple
+    writes: tuple
+    count: int  # instructions the call ran
+    absolute: frozenset  # addresses among the keys, relative keys must not land on them
+
+    @property
+    def size(self) -> int:
+        return len(self.inputs) + len(self.writes)
+
+    def matches(self, memory: Memory, relative_base: int) -> bool:
+        absolute = self.absolute
+        for relative, key, value in self.inputs:
+            if relative:
+                key += relative_base
+                if key < 0 or key in absolute:
+                    return False
+            if memory[key] != value:
+                return False
+        for relative, key, value in self.writes:
+            if relative and (key + relative_base < 0 or key + relative_base in absolute):
+                return False
+        return True
+
+    def apply(self, memory: Memory, relative_base: int):
+        for relative, key, value in self.writes:
+            memory[key + relative_base if relative else key] = value
+
+
+class Frame:
+    """A traced call, cells read before being written and the last value written to each cell"""
+    __slots__ = ("entry", "relative_base", "return_address", "key", "reads", "writes", "relative", "absolute",
+                 "return_reads", "count")
+
+    def __init__(self, entry: int, relative_base: int, return_address: int, key, count: int):
+        self.entry = entry
+        self.relative_base = relative_base
+        self.return_address = return_address
+        self.key = key  # memo key of the arguments when the call was made
+        self.reads = {}
+        self.writes = {}
+        self.relative = set()
+        self.absolute = set()
+        self.return_reads = 0  # reads of the cell holding the return address
+        self.count = count  # instructions executed when the call was made
+
+    def read(self, memory: Memory, cell: int, relative: bool):
+        value = memory[cell]
+        if cell not in self.writes and cell not in self.reads:
+            self.reads[cell] = value
+        (self.relative if relative else self.absolute).add(cell)
+        if cell == self.relative_base:
+            self.return_reads += 1
+        return value
+
+    def write(self, memory: Memory, cell: int, relative: bool, value: int):
+        memory[cell] = value
+        self.writes[cell] = value
+        (self.relative if relative else self.absolute).add(cell)
+
+    def merge(self, inputs, writes):
+        """Accounts for the (cell, relative, value) reads and writes of a call made from this frame"""
+        for cell, relative, value in inputs:
+            if cell not in self.writes and cell not in self.reads:
+                self.reads[cell] = value
+            (self.relative if relative else self.absolute).add(cell)
+            if cell == self.relative_base:
+                self.return_reads += 1
+        for cell, relative, value in writes:
+            self.writes[cell] = value
+            (self.relative if relative else self.absolute).add(cell)
+
+    def finish(self, count: int):
+        """MemoEntry of the returned call, None if it can not be replayed elsewhere"""
+        if self.relative & self.absolute or len(self.reads) + len(self.writes) > MAX_ENTRY_CELLS:
+            return None
+        reads = dict(self.reads)
+        if self.return_reads == 1:
+            # only the return jump read it, calls from other sites share the entry
+            reads.pop(self.relative_base, None)
+        base = self.relative_base
+
+        def cells(values):
+            return tuple((cell in self.relative, cell - base if cell in self.relative else cell, value)
+                         for cell, value in values.items())
+
+        return MemoEntry(cells(reads), cells(self.writes), count - self.count, frozenset(self.absolute))
+
+
+class SubroutineMemo:
+    """Engine memoizing Intcode subroutines.
+
+    Programs call a subroutine by storing the return address at the relative base, jumping to an `arb`
+    with a positive offset and returning with the matching `arb` and a jump through that cell. Calls are
+    recognised by that shape when the run loop hands over a jump; once a subroutine got called often
+    enough its calls are traced, recording every cell read before it was written, code included, and the
+    last value written to every cell. Cells accessed in relative mode are recorded relative to the
+    relative base of the call, so a recursive call deeper in the stack hits the same entry.
+
+    A later call replays an entry if all its inputs hold, writing its values and counting its instructions,
+    nested calls inside a traced call are looked up as well, which turns exponential recursions polynomial.
+    Calls reaching IO or halt are impure: they are handed back to the run loop right there and their
+    subroutine is left untraced for exponentially more calls. Entries live in an LRU table holding at
+    most `capacity` recorded cells over all of them.
+    `engine` optionally takes a further engine factory, it gets every other jump.
+    """
+
+    def __init__(self, memory: Memory, threshold: int = CALL_THRESHOLD, capacity: int = MEMO_CAPACITY, engine=None):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.memo = OrderedDict()  # (entry, argument values) -> [MemoEntry]
+        self.cells = 0  # recorded cells in the table
+        self.signatures = {}  # entry -> relative offsets of the arguments
+        self.heat = {}
+        self.cooldown = {}  # entry -> (calls left untraced, next cooldown)
+        self.engine = None if engine is None else engine(memory)
+        self.hits = 0
+
+    def key(self, memory: Memory, entry: int, relative_base: int):
+        """Memo key of a call, None before the subroutine's arguments are known"""
+        signature = self.signatures.get(entry)
+        if signature is None or any(relative_base + offset < 0 for offset in signature):
+            return None
+        return entry, tuple(memory[relative_base + offset] for offset in signature)
+
+    def lookup(self, memory: Memory, key, relative_base: int, budget: int):
+        if key is None:
+            return None
+        for candidate in self.memo.get(key, ()):
+            if candidate.count <= budget and candidate.matches(memory, relative_base):
+                self.memo.move_to_end(key)
+                self.hits += 1
+                return candidate
+        return None
+
+    def remember(self, frame: Frame, memo_entry: MemoEntry):
+        key = frame.key
+        if key is None:
+            # the relative mode inputs of the first traced call are taken as the arguments
+            signature = self.signatures.setdefault(frame.entry, tuple(sorted(
+                offset for relative, offset, value in memo_entry.inputs if relative)))
+            values = {offset: value for relative, offset, value in memo_entry.inputs if relative}
+            if any(offset not in values for offset in signature):
+                return
+            key = (frame.entry, tuple(values[offset] for offset in signature))
+        bucket = self.memo.get(key)
+        if bucket is None:
+            bucket = self.memo[key] = []
+        else:
+            self.memo.move_to_end(key)
+        bucket.append(memo_entry)
+        self.cells += memo_entry.size
+        if len(bucket) > BUCKET_SIZE:
+            self.cells -= bucket.pop(0).size
+        while self.cells > self.capacity:
+            self.cells -= sum(evicted.size for evicted in self.memo.popitem(last=False)[1])
+
+    def traced(self, entry: int) -> bool:
+        heat = self.heat.get(entry, 0)
+        if heat < self.threshold:
+            self.heat[entry] = heat + 1
+            if heat + 1 < self.threshold:
+                return False
+        cooldown = self.cooldown.get(entry)
+        if cooldown is not None and cooldown[0] > 0:
+            self.cooldown[entry] = (cooldown[0] - 1, cooldown[1])
+            return False
+        return True
+
+    def impure(self, frames: [Frame]):
+        for frame in frames:
+            cooldown = self.cooldown.get(frame.entry, (0, 1))[1]
+            self.cooldown[frame.entry] = (cooldown, min(2 * cooldown, MAX_COOLDOWN))
+
+    @staticmethod
+    def operand(frame: Frame, memory: Memory, parameter: int, mode: int, relative_base: int):
+        if mode == 1:
+            return parameter
+        if mode == 0:
+            return frame.read(memory, parameter, False)
+        return frame.read(memory, relative_base + parameter, True)
+
+    def trace(self, memory: Memory, address: int, relative_base: int, budget: int, frames: [Frame]):
+        """Runs the outermost frame's call to its return, IO, halt or the end of the budget.
+
+        Returns the address, relative base and the instructions executed.
+        """
+        operand = self.operand
+        executed = 0
+        frame = frames[-1]
+        while executed < budget:
+            value = frame.read(memory, address, False)
+            opcode = value % 100
+            count = OPERAND_COUNTS.get(opcode)
+            if count is None or value < 0 or value // 10 ** (count + 2) != 0:
+                # IO, halt or something the run loop has to report
+                self.impure(frames)
+                return address, relative_base, executed
+            modes = [value // 10 ** (order + 1) % 10 for order in range(1, count + 1)]
+            if any(mode > 2 for mode in modes) or (count == 3 and modes[2] == 1):
+                self.impure(frames)
+                return address, relative_base, executed
+            parameters = [frame.read(memory, address + order, False) for order in range(1, count + 1)]
+            executed += 1
+            if opcode == 9:
+                relative_base += operand(frame, memory, parameters[0], modes[0], relative_base)
+                address += 2
+                continue
+            if opcode == 5 or opcode == 6:
+                condition = operand(frame, memory, parameters[0], modes[0], relative_base)
+                if not ((condition > 0) if opcode == 5 else (condition == 0)):
+                    address += 3
+                    continue
+                origin, address = address, operand(frame, memory, parameters[1], modes[1], relative_base)
+                if address == frame.return_address and relative_base == frame.relative_base:
+                    frames.pop()
+                    memo_entry = frame.finish(executed)
+                    if memo_entry is not None:
+                        self.remember(frame, memo_entry)
+                    if not frames:
+                        return address, relative_base, executed
+                    parent = frames[-1]
+                    parent.merge(((cell, cell in frame.relative, value) for cell, value in frame.reads.items()),
+                                 ((cell, cell in frame.relative, value) for cell, value in frame.writes.items()))
+                    frame = parent
+                elif relative_base >= 0 and memory[address] == ARB_IMMEDIATE and memory[address + 1] > 0 and \
+                        memory[relative_base] == origin + 3:
+                    key = self.key(memory, address, relative_base)
+                    hit = self.lookup(memory, key, relative_base, budget - executed)
+                    if hit is not None:
+                        hit.apply(memory, relative_base)
+                        # the return jump of the call read its return address
+                        frame.merge(((key + relative_base if relative else key, relative, value)
+                                     for relative, key, value in hit.inputs + ((True, 0, origin + 3),)),
+                                    ((key + relative_base if relative else key, relative, value)
+                                     for relative, key, value in hit.writes))
+                        executed += hit.count
+                        address = origin + 3
+                    else:
+                        frame = Frame(address, relative_base, origin + 3, key, executed)
+                        frames.append(frame)
+                continue
+            a = operand(frame, memory, parameters[0], modes[0], relative_base)
+            b = operand(frame, memory, parameters[1], modes[1], relative_base)
+            if opcode == 1:
+                result = a + b
+            elif opcode == 2:
+                result = a * b
+            elif opcode == 7:
+                result = 1 if a < b else 0
+            else:
+                result = 1 if a == b else 0
+            frame.write(memory, parameters[2] + (relative_base if modes[2] == 2 else 0), modes[2] == 2, result)
+            address += 4
+        return address, relative_base, executed
+
+    def enter(self, memory: Memory, origin: int, address: int, relative_base: int, budget: int):
+        executed = 0
+        if memory[address] == ARB_IMMEDIATE and address != origin and memory[address + 1] > 0 and \
+                relative_base >= 0 and memory[relative_base] == origin + 3:
+            key = self.key(memory, address, relative_base)
+            hit = self.lookup(memory, key, relative_base, budget)
+            if hit is not None:
+                hit.apply(memory, relative_base)
+                address, executed = origin + 3, hit.count
+            elif self.traced(address):
+                address, relative_base, executed = self.trace(
+                    memory, address, relative_base, budget, [Frame(address, relative_base, origin + 3, key, 0)])
+        if self.engine is None or executed >= budget:
+            return address, relative_base, executed
+        address, relative_base, count = self.engine.enter(memory, origin, address, relative_base, budget - executed)
+        return address, relative_base, executed + count
+
+
+if __name__ == "__main__":
+    import functools
+    from aoc2019.intcode import ExecutionInterrupt, IntcodeProgram
+
+    # naive recursive fib(n) = fib(n - 1) + fib(n - 2), arguments and results passed at the relative base
+    def fib(n):
+        return [109, 1000, 21101, 0, n, 1, 21101, 0, 13, 0, 1105, 1, 16, 204, 1, 99,
+                109, 3, 21207, -2, 2, -1, 1205, -1, 58, 21201, -2, -1, 1, 21101, 0, 36, 0, 1105, 1, 16,
+                22101, 0, 1, -1, 21201, -2, -2, 1, 21101, 0, 51, 0, 1105, 1, 16, 22201, 1, -1, -2, 1105, 1, 58,
+                109, -3, 2105, 1, 0]
+
+    expected = IntcodeProgram(fib(18), [])
+    expected.execute()
+    program = IntcodeProgram(fib(18), [], engine=SubroutineMemo)
+    assert program.execute().io.outputs == expected.io.outputs == [2584]
+    assert program.instruction_count == expected.instruction_count and program.engine.hits > 0
+
+    # exponentially many calls, the memo runs each argument once and still counts every instruction
+    program = IntcodeProgram(fib(80), [], engine=SubroutineMemo)
+    assert program.execute().io.outputs == [23416728348467685]
+    assert program.instruction_count > 10 ** 17 and len(program.engine.memo) < 100
+
+    # the table is bounded by the cells it records, evicting the least recently used signatures
+    program = IntcodeProgram(fib(18), [], engine=functools.partial(SubroutineMemo, capacity=300))
+    assert program.execute().io.outputs == [2584] and program.instruction_count == expected.instruction_count
+    memo = program.engine
+    assert memo.cells == sum(entry.size for bucket in memo.memo.values() for entry in bucket) <= 300
+
+    # an entry running longer than the budget is not replayed, a fused pair still overshoots by one
+    program = IntcodeProgram(fib(18), [], engine=functools.partial(SubroutineMemo, threshold=1))
+    count = 0
+    while program.execute_until_interrupt(set(), budget=100) == ExecutionInterrupt.BUDGET_EXHAUSTED:
+        assert 100 <= program.instruction_count - count <= 101
+        count = program.instruction_count
+    assert program.io.outputs == [2584] and program.instruction_count == expected.instruction_count
+
+    # a subroutine doing output is handed back to the run loop and left alone for a while
+    show = [109, 100, 21101, 0, 7, 1, 21101, 0, 13, 0, 1105, 1, 27, 21101, 0, 8, 1, 21101, 0, 24, 0, 1105, 1, 27,
+            99, 0, 0, 109, 2, 204, -1, 109, -2, 2105, 1, 0]
+    program = IntcodeProgram(show, [], engine=functools.partial(SubroutineMemo, threshold=1))
+    assert program.execute().io.outputs == [7, 8] and program.engine.cooldown[27] == (0, 2)
+
+    # program = [int(s) for s in open("day09/input1.txt").read().strip().split(',')]
+    # print(IntcodeProgram(program, [2], engine=SubroutineMemo).execute().io.outputs)
+    print("SUCCESS!")
@@ -0,0 +1,566 @@
+import itertools
+import math
+from dataclasses import dataclass, field
+
+from aoc2019.intcode import IntcodeProgram
+
+MAX_PATHS = 64
+PATH_BUDGET = 1_000_000  # instructions per path
+
+
+class Polynomial:
+    """Integer polynomial over atoms, immutable.
+
+    `terms` maps monomials, sorted tuples of atoms, to coefficients, the constant is the empty monomial.
+    An atom is a symbol name or an opaque Comparison or Load standing for a value the polynomial can not
+    express. Values that are plain ints stay ints, see `lift`.
+    """
+    __slots__ = ("terms",)
+
+    def __init__(self, terms: dict):
+        self.terms = {monomial: coefficient for monomial, coefficient in terms.items() if coefficient != 0}
+
+    @classmethod
+    def atom(cls, atom):
+        return cls({(atom,): 1})
+
+    def constant(self):
+        """Value if the polynomial is constant, None otherwise"""
+        if not self.terms:
+            return 0
+        return self.terms.get(()) if len(self.terms) == 1 else None
+
+    def __add__(self, other):
+        terms = dict(self.terms)
+        for monomial, coefficient in lift(other).terms.items():
+            terms[monomial] = terms.get(monomial, 0) + coefficient
+        return Polynomial(terms)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return Polynomial({monomial: -coefficient for monomial, coefficient in self.terms.items()})
+
+    def __sub__(self, other):
+        return self + -lift(other)
+
+    def __rsub__(self, other):
+        return lift(other) + -self
+
+    def __mul__(self, other):
+        terms = {}
+        for (left, a), (right, b) in itertools.product(self.terms.items(), lift(other).terms.items()):
+            monomial = tuple(sorted(left + right, key=repr))
+            terms[monomial] = terms.get(monomial, 0) + a * b
+        return Polynomial(terms)
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        return isinstance(other, Polynomial) and self.terms == other.terms
+
+    def __hash__(self):
+        return hash(frozenset(self.terms.items()))
+
+    def atoms(self) -> set:
+        return {atom for monomial in self.terms for atom in monomial}
+
+    def symbols(self) -> set:
+        """Names of the symbols the polynomial depends on, through comparisons as well"""
+        names = set()
+        for atom in self.atoms():
+            names |= {atom} if isinstance(atom, str) else atom.symbols()
+        return names
+
+    def has_loads(self) -> bool:
+        """Depends on a value read through a symbolic address, directly or through a comparison"""
+        return any(isinstance(atom, Load) or (isinstance(atom, Comparison) and atom.difference.has_loads())
+                   for atom in self.atoms())
+
+    def is_affine(self) -> bool:
+        """Of degree one at most in plain symbols, comparisons and loads excluded"""
+        return all(len(monomial) == 0 or (len(monomial) == 1 and isinstance(monomial[0], str))
+                   for monomial in self.terms)
+
+    def evaluate(self, assignment: dict) -> int:
+        total = 0
+        for monomial, coefficient in self.terms.items():
+            for atom in monomial:
+                coefficient *= assignment[atom] if isinstance(atom, str) else atom.evaluate(assignment)
+            total += coefficient
+        return total
+
+    def bounds(self, domains: dict):
+        """(low, high) of an affine polynomial over the domain ranges, None if it is not bounded by them"""
+        if not self.is_affine() or any(monomial and monomial[0] not in domains for monomial in self.terms):
+            return None
+        low = high = self.terms.get((), 0)
+        for monomial, coefficient in self.terms.items():
+            if monomial:
+                domain = domains[monomial[0]]
+                if len(domain) == 0:
+                    return None
+                ends = (coefficient * domain[0], coefficient * domain[-1])
+                low, high = low + min(ends), high + max(ends)
+        return low, high
+
+    def __repr__(self):
+        if not self.terms:
+            return "0"
+        parts = []
+        for monomial, coefficient in sorted(self.terms.items(), key=lambda term: (-len(term[0]), repr(term[0]))):
+            factors = [atom if isinstance(atom, str) else f"({atom!r})" for atom in monomial]
+            if not factors or abs(coefficient) != 1:
+                factors.insert(0, str(coefficient))
+            parts.append(("-" if coefficient == -1 and monomial else "") + "*".join(factors))
+        return " + ".join(parts).replace("+ -", "- ")
+
+
+def lift(value) -> Polynomial:
+    return value if isinstance(value, Polynomial) else Polynomial({(): value})
+
+
+def simplify(value):
+    """Plain int for constant polynomials"""
+    if isinstance(value, Polynomial):
+        constant = value.constant()
+        return value if constant is None else constant
+    return value
+
+
+def symbol(name: str) -> Polynomial:
+    return Polynomial.atom(name)
+
+
+@dataclass(frozen=True)
+class Comparison:
+    """Flag of `lt` (difference < 0) or `eq` (difference == 0), 1 when it holds and 0 otherwise"""
+    opcode: int
+    difference: Polynomial
+
+    def evaluate(self, assignment: dict) -> int:
+        difference = self.difference.evaluate(assignment)
+        return 1 if (difference < 0 if self.opcode == 7 else difference == 0) else 0
+
+    def symbols(self) -> set:
+        return self.difference.symbols()
+
+    def __repr__(self):
+        return f"{self.difference!r} {'<' if self.opcode == 7 else '=='} 0"
+
+
+@dataclass(frozen=True)
+class Load:
+    """Value read through a symbolic address, opaque to evaluation"""
+    address: Polynomial
+    serial: int
+
+    def evaluate(self, assignment: dict) -> int:
+        raise ValueError(f"value at symbolic address {self.address!r} is not known")
+
+    def symbols(self) -> set:
+        return self.address.symbols()
+
+    def __repr__(self):
+        return f"[{self.address!r}]"
+
+
+RELATIONS = {
+    "<0": lambda value: value < 0,
+    ">=0": lambda value: value >= 0,
+    ">0": lambda value: value > 0,
+    "<=0": lambda value: value <= 0,
+    "==0": lambda value: value == 0,
+    "!=0": lambda value: value != 0,
+}
+NEGATIONS = {"<0": ">=0", ">=0": "<0", ">0": "<=0", "<=0": ">0", "==0": "!=0", "!=0": "==0"}
+
+
+@dataclass(frozen=True)
+class Constraint:
+    expression: Polynomial
+    relation: str  # one of RELATIONS, the expression compared to 0
+
+    def holds(self, assignment: dict) -> bool:
+        return RELATIONS[self.relation](self.expression.evaluate(assignment))
+
+    def feasible(self, domains: dict) -> bool:
+        """False only if no assignment from the domains can satisfy it, judged by the bounds of affine expressions"""
+        bounds = self.expression.bounds(domains)
+        if bounds is None:
+            return True
+        low, high = bounds
+        if self.relation == "==0":
+            divisor = math.gcd(*(coefficient for monomial, coefficient in self.expression.terms.items() if monomial))
+            return low <= 0 <= high and (divisor == 0 or self.expression.terms.get((), 0) % divisor == 0)
+        if self.relation == "!=0":
+            return not low == high == 0
+        return RELATIONS[self.relation](low) or RELATIONS[self.relation](high)
+
+    def __repr__(self):
+        return f"{self.expression!r} {self.relation[:-1]} 0"
+
+
+def condition(value, jump_if_true: bool, taken: bool) -> Constraint:
+    """Constraint under which a `jnz` (value > 0) or `jz` (value == 0) on a symbolic value is or is not taken"""
+    (monomial, coefficient), = value.terms.items() if len(value.terms) == 1 else (((), 0),)
+    if coefficient == 1 and len(monomial) == 1 and isinstance(monomial[0], Comparison):
+        # a flag from lt/eq, jnz takes it when the comparison holds and jz when it does not
+        comparison = monomial[0]
+        relation = "<0" if comparison.opcode == 7 else "==0"
+        holds = taken if jump_if_true else not taken
+        return Constraint(comparison.difference, relation if holds else NEGATIONS[relation])
+    relation = ">0" if jump_if_true else "==0"
+    return Constraint(value, relation if taken else NEGATIONS[relation])
+
+
+@dataclass
+class Path:
+    """One way through the program, `status` is "halt", "input" when it ran out of inputs, "budget",
+    "paths" when forking was cut off or "unsupported" with the reason, e.g. a write through a symbolic address"""
+    memory: dict
+    address: int = 0
+    relative_base: int = 0
+    input_index: int = 0
+    outputs: list = field(default_factory=list)
+    constraints: [Constraint] = field(default_factory=list)
+    steps: int = 0
+    status: str = None
+    reason: str = ""
+
+    def __getitem__(self, address: int):
+        return self.memory.get(address, 0)
+
+    def fork(self):
+        return Path(dict(self.memory), self.address, self.relative_base, self.input_index, list(self.outputs),
+                    list(self.constraints), self.steps)
+
+    def feasible(self, assignment: dict) -> bool:
+        return all(constraint.holds(assignment) for constraint in self.constraints)
+
+
+class SymbolicProgram:
+    """Intcode run over symbolic values, forking at jumps that depend on them.
+
+    `symbols` maps image addresses to symbol names, `inputs` holds ints and symbol names; arithmetic and
+    comparisons build Polynomials, comparisons that the `domains` ranges already decide fold to constants.
+    Each jump on a symbolic value continues on both sides under a Constraint, sides the domains rule out are
+    pruned. Addresses, jump targets and opcodes have to stay concrete, reads through a symbolic address give
+    an opaque Load, writes through one stop the path as unsupported.
+    """
+
+    def __init__(self, program, symbols: dict = None, inputs=(), domains: dict = None,
+                 max_paths: int = MAX_PATHS, budget: int = PATH_BUDGET):
+        memory = dict(enumerate(program))
+        for address, name in (symbols or {}).items():
+            memory[address] = symbol(name)
+        self.start = Path(memory)
+        self.inputs = [symbol(value) if isinstance(value, str) else value for value in inputs]
+        self.domains = domains or {}
+        self.max_paths = max_paths
+        self.budget = budget
+        self.loads = 0
+
+    def run(self) -> [Path]:
+        """Every path explored, depth first, in the order they ended"""
+        pending = [self.start.fork()]
+        paths = []
+        started = 1
+        while pending:
+            path = pending.pop()
+            fork = self.step(path)
+            while fork is None and path.status is None:
+                fork = self.step(path)
+            if fork is not None:
+                if started < self.max_paths:
+                    started += 1
+                    pending.append(fork)
+                else:
+                    fork.status = "paths"
+                    paths.append(fork)
+                if path.status is None:
+                    pending.append(path)
+                    continue
+            paths.append(path)
+        return paths
+
+    def load(self, path: Path, parameter, mode: int):
+        if mode == 1:
+            return parameter
+        if not isinstance(parameter, int):
+            self.loads += 1
+            return Polynomial.atom(Load(lift(parameter) + (path.relative_base if mode == 2 else 0), self.loads))
+        return path[parameter if mode == 0 else path.relative_base + parameter]
+
+    def step(self, path: Path):
+        """Runs one instruction, returns the other side of a symbolic jump as a new path"""
+        if path.steps >= self.budget:
+            path.status = "budget"
+            return None
+        value = path[path.address]
+        if not isinstance(value, int):
+            return self.unsupported(path, f"symbolic instruction {value!r} at {path.address}")
+        opcode = value % 100
+        size = {1: 4, 2: 4, 3: 2, 4: 2, 5: 3, 6: 3, 7: 4, 8: 4, 9: 2, 99: 1}.get(opcode)
+        if size is None:
+            return self.unsupported(path, f"unknown instruction {value} at {path.address}")
+        modes = [value // 10 ** (order + 1) % 10 for order in range(1, size)]
+        parameters = [path[path.address + order] for order in range(1, size)]
+        path.steps += 1
+        if opcode == 99:
+            path.status = "halt"
+            return None
+        if opcode in (1, 2, 7, 8):
+            a, b = (self.load(path, parameter, mode) for parameter, mode in zip(parameters[:2], modes[:2]))
+            if opcode == 1:
+                result = a + b
+            elif opcode == 2:
+                result = a * b
+            else:
+                result = self.compare(opcode, a, b)
+            return self.store(path, parameters[2], modes[2], simplify(result), 4)
+        if opcode == 3:
+            if path.input_index >= len(self.inputs):
+                path.steps -= 1
+                path.status = "input"
+                return None
+            path.input_index += 1
+            return self.store(path, parameters[0], modes[0], self.inputs[path.input_index - 1], 2)
+        if opcode == 4:
+            path.outputs.append(self.load(path, parameters[0], modes[0]))
+            path.address += 2
+            return None
+        if opcode == 9:
+            offset = self.load(path, parameters[0], modes[0])
+            if not isinstance(offset, int):
+                return self.unsupported(path, f"symbolic relative base offset at {path.address}")
+            path.relative_base += offset
+            path.address += 2
+            return None
+        return self.jump(path, opcode == 5, self.load(path, parameters[0], modes[0]),
+                         self.load(path, parameters[1], modes[1]))
+
+    def compare(self, opcode: int, a, b):
+        if isinstance(a, int) and isinstance(b, int):
+            return 1 if (a < b if opcode == 7 else a == b) else 0
+        difference = lift(a) - lift(b)
+        holds = Constraint(difference, "<0" if opcode == 7 else "==0")
+        if not holds.feasible(self.domains):
+            return 0
+        if not Constraint(difference, NEGATIONS[holds.relation]).feasible(self.domains):
+            return 1
+        return Polynomial.atom(Comparison(opcode, difference))
+
+    def store(self, path: Path, parameter, mode: int, value, size: int):
+        if mode == 1 or not isinstance(parameter, int):
+            return self.unsupported(path, f"write through a symbolic or immediate address at {path.address}")
+        path.memory[parameter if mode == 0 else path.relative_base + parameter] = value
+        path.address += size
+        return None
+
+    def jump(self, path: Path, jump_if_true: bool, value, target):
+        if isinstance(value, int):
+            taken = value > 0 if jump_if_true else value == 0
+            if taken and not isinstance(target, int):
+                return self.unsupported(path, f"jump to symbolic address {target!r} at {path.address}")
+            path.address = target if taken else path.address + 3
+            return None
+        sides = []
+        for taken in (True, False):
+            constraint = condition(value, jump_if_true, taken)
+            if constraint.feasible(self.domains):
+                sides.append((taken, constraint))
+        if not sides:
+            path.status = "unsupported"
+            path.reason = f"no side of the jump at {path.address} is feasible"
+            return None
+        fork = None
+        if len(sides) == 2:
+            fork = path.fork()
+            self.follow(fork, *sides[1], target)
+        self.follow(path, *sides[0], target)
+        return fork
+
+    def follow(self, path: Path, taken: bool, constraint: Constraint, target):
+        path.constraints.append(constraint)
+        if taken and not isinstance(target, int):
+            self.unsupported(path, f"jump to symbolic address {target!r} at {path.address}")
+            return
+        path.address = target if taken else path.address + 3
+
+    @staticmethod
+    def unsupported(path: Path, reason: str):
+        path.status = "unsupported"
+        path.reason = reason
+        return None
+
+
+def solve(expression, target: int, domains: dict, constraints=()):
+    """Assignments of the domain ranges making `expression` equal `target` and satisfying the constraints.
+
+    An affine expression is solved for its symbol with the widest domain, only the others are enumerated;
+    anything else is evaluated over the product of the domains of the symbols it uses.
+    """
+    expression = lift(expression) - target
+    names = set(expression.symbols())
+    for constraint in constraints:
+        names |= constraint.expression.symbols()
+    missing = names - set(domains)
+    if missing:
+        raise ValueError(f"no domain for {', '.join(sorted(missing))}")
+    solved = None
+    if expression.is_affine() and expression.symbols():
+        # sorted first, so a tie between domains does not depend on the hash seed
+        solved = max(sorted(expression.symbols()), key=lambda name: len(domains[name]))
+        coefficient = expression.terms[(solved,)]
+    enumerated = sorted(names - {solved})
+    for values in itertools.product(*(domains[name] for name in enumerated)):
+        assignment = dict(zip(enumerated, values))
+        if solved is not None:
+            rest = (expression - coefficient * symbol(solved)).evaluate(assignment)
+            if rest % coefficient != 0 or -rest // coefficient not in domains[solved]:
+                continue
+            assignment[solved] = -rest // coefficient
+        elif expression.evaluate(assignment) != 0:
+            continue
+        if all(constraint.holds(assignment) for constraint in constraints):
+            yield assignment
+
+
+def symbol_names(symbols: dict, inputs, domains: dict) -> [str]:
+    """Sorted names of the image and input symbols, each of them needs a domain"""
+    names = sorted(set(symbols.values()) | {value for value in inputs if isinstance(value, str)})
+    missing = set(names) - set(domains)
+    if missing:
+        raise ValueError(f"no domain for {', '.join(sorted(missing))}")
+    return names
+
+
+def complete(assignment: dict, names: [str], domains: dict):
+    """Assignments of all the names extending a partial one, free names take every value of their domain"""
+    free = [name for name in names if name not in assignment]
+    for values in itertools.product(*(domains[name] for name in free)):
+        values = dict(zip(free, values))
+        yield {name: assignment[name] if name in assignment else values[name] for name in names}
+
+
+def concrete_solutions(program, symbols: dict, inputs, domains: dict, target: int, address: int, output: int,
+                       budget: int, constraints=()):
+    """Assignments of all symbols satisfying the constraints for which a concrete run reaches the target"""
+    names = symbol_names(symbols, inputs, domains)
+    for values in itertools.product(*(domains[name] for name in names)):
+        assignment = dict(zip(names, values))
+        if not all(constraint.holds(assignment) for constraint in constraints):
+            continue
+        run = IntcodeProgram(program, [assignment[value] if isinstance(value, str) else value for value in inputs])
+        for cell, name in symbols.items():
+            run.memory[cell] = assignment[name]
+        try:
+            run.execute(budget)
+        except Exception:
+            continue  # running out of inputs or budget, a negative address, ... the candidate is no solution
+        if address is not None:
+            if run.memory[address] == target:
+                yield assignment
+        elif output is not None and output < len(run.io.outputs) and run.io.outputs[output] == target:
+            yield assignment
+
+
+def find_inputs(program, symbols: dict, domains: dict, target: int, address: int = None, output: int = None,
+                inputs=(), max_paths: int = MAX_PATHS, budget: int = PATH_BUDGET):
+    """Assignments of the symbols for which the program halts with `target` in memory at `address`, or as
+    output number `output`; one symbolic run instead of a run per candidate, e.g. day02's noun and verb.
+
+    Every assignment names all symbols, in sorted order; a symbol the result does not depend on takes
+    every value of its domain. Halted paths whose result or constraints read through a symbolic address
+    are marked unsupported; unsupported paths and those cut off by `max_paths` fall back to concrete runs
+    of the candidates satisfying the rest of their constraints.
+    """
+    names = symbol_names(symbols, inputs, domains)
+    found = set()
+    for path in SymbolicProgram(program, symbols, inputs, domains, max_paths, budget).run():
+        value = None
+        if path.status == "halt":
+            if address is not None:
+                value = path[address]
+            elif output is not None and output < len(path.outputs):
+                value = path.outputs[output]
+            else:
+                continue
+            if lift(value).has_loads() or any(constraint.expression.has_loads() for constraint in path.constraints):
+                SymbolicProgram.unsupported(path, "the result depends on a read through a symbolic address")
+        if path.status == "halt":
+            solutions = (full for partial in solve(value, target, domains, path.constraints)
+                         for full in complete(partial, names, domains))
+        elif path.status in ("unsupported", "paths"):
+            solutions = concrete_solutions(program, symbols, inputs, domains, target, address, output, budget,
+                                           [constraint for constraint in path.constraints
+                                            if not constraint.expression.has_loads()])
+        else:
+            continue
+        for assignment in solutions:
+            # concrete runs of one path's candidates may follow another path
+            key = tuple(sorted(assignment.items()))
+            if key not in found:
+                found.add(key)
+                yield assignment
+
+
+if __name__ == "__main__":
+    # day02 style: noun and verb are image cells, the result at address 0 is affine in them
+    program = [1, 0, 0, 3, 1, 1, 2, 3, 1, 3, 4, 3, 1, 5, 0, 3, 2, 1, 10, 19, 2, 19, 9, 0, 99]
+    paths = SymbolicProgram(program, {1: "noun", 2: "verb"}).run()
+    assert [path.status for path in paths] == ["halt"] and paths[0][0].is_affine()
+    domains = {"noun": range(100), "verb": range(100)}
+    assert list(find_inputs(program, {1: "noun", 2: "verb"}, domains, 1234, address=0)) == \
+           [assignment for assignment in ({"noun": noun, "verb": verb} for noun in range(100) for verb in range(100))
+            if paths[0][0].evaluate(assignment) == 1234]
+
+    # jumps on a symbolic input fork into paths constrained to one side each
+    larger_example = [3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31, 1106, 0, 36, 98, 0, 0,
+                      1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104, 999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105,
+                      1, 46, 98, 99]
+    paths = SymbolicProgram(larger_example, inputs=["x"], domains={"x": range(-100, 100)}).run()
+    assert sorted(repr(path.outputs) for path in paths) == ["[1001]", "[125*x]", "[999]"]
+    assert list(find_inputs(larger_example, {}, {"x": range(-100, 100)}, 1000, output=0, inputs=["x"])) == [{"x": 8}]
+    assert len(list(find_inputs(larger_example, {}, {"x": range(-100, 100)}, 999, output=0, inputs=["x"]))) == 108
+
+    # the domains prune a side that can not be taken
+    paths = SymbolicProgram(larger_example, inputs=["x"], domains={"x": range(10, 20)}).run()
+    assert [path.outputs for path in paths] == [[1001]]
+
+    # products are not affine, they are solved by evaluating the expression over the domains
+    product = [3, 100, 3, 101, 2, 100, 101, 102, 4, 102, 99]
+    assert list(find_inputs(product, {}, {"x": range(2, 50), "y": range(2, 50)}, 391, output=0,
+                            inputs=["x", "y"])) == [{"x": 17, "y": 23}, {"x": 23, "y": 17}]
+    assert SymbolicProgram(product, inputs=["x"]).run()[0].status == "input"
+
+    # an address that depends on a symbol can not be written through
+    path, = SymbolicProgram([3, 5, 1101, 1, 1, 0, 99], inputs=["x"]).run()
+    assert path.status == "unsupported" and "symbolic" in path.reason
+
+    # reads through symbolic addresses are opaque, their candidates are run concretely
+    indirect = [1, 0, 0, 0, 99]
+    domains = {"noun": range(5), "verb": range(5)}
+    expected = [{"noun": noun, "verb": verb} for noun in range(5) for verb in range(5)
+                if IntcodeProgram([1, noun, verb, 0, 99], []).execute().memory[0] == 100]
+    assert expected and list(find_inputs(indirect, {1: "noun", 2: "verb"}, domains, 100, address=0)) == expected
+    assert list(find_inputs([3, 7, 3, 8, 104, 42, 99, 0, 0], {}, {"x": range(3), "y": range(3)}, 42, output=0,
+                            inputs=["x", "y"])) == [{"x": x, "y": y} for x in range(3) for y in range(3)]
+    unsupported = [3, 5, 1101, 1, 1, 0, 4, 9, 99, 0]
+    assert list(find_inputs(unsupported, {}, {"x": range(10)}, 2, output=0, inputs=["x"])) == [{"x": 9}]
+
+    # a symbol the result ignores takes every value of its domain, answers always name every symbol
+    ignores_y = [3, 13, 3, 14, 1001, 13, 5, 15, 4, 15, 99, 0, 0, 0, 0, 0]
+    assert list(find_inputs(ignores_y, {}, {"x": range(10), "y": range(3)}, 8, output=0, inputs=["x", "y"])) == \
+           [{"x": 3, "y": 0}, {"x": 3, "y": 1}, {"x": 3, "y": 2}]
+    ignores_verb = [1101, 0, 4, 0, 99, 0]
+    assert list(find_inputs(ignores_verb, {1: "noun", 5: "verb"}, {"noun": range(5), "verb": range(2)}, 7,
+                            address=0)) == [{"noun": 3, "verb": 0}, {"noun": 3, "verb": 1}]
+
+    # ties between domains of the same size are broken by name, not by the hash seed
+    assert list(solve(symbol("b") + symbol("a"), 3, {"a": range(3), "b": range(3)})) == \
+           [{"b": 1, "a": 2}, {"b": 2, "a": 1}]
+    assert [list(assignment) for assignment in solve(symbol("b") + symbol("a"), 3,
+                                                      {"a": range(3), "b": range(3)})] == [["b", "a"]] * 2
+    print("SUCCESS!")
@@ -1,3 +1,5 @@
+from aoc2019.symbolic import find_inputs
+
 input_seq = [1, 0, 0, 3, 1, 1, 2, 3, 1, 3, 4, 3, 1, 5, 0, 3, 2, 13, 1, 19, 1, 6, 19, 23, 2, 6, 23, 27, 1, 5, 27,
              31, 2, 31, 9, 35, 1, 35, 5, 39, 1, 39, 5, 43, 1, 43, 10, 47, 2, 6, 47, 51, 1, 51, 5, 55, 2, 55,
              6, 59, 1, 5, 59, 63, 2, 63, 6, 67, 1, 5, 67, 71, 1, 71, 6, 75, 2, 75, 10, 79, 1, 79, 5, 83, 2, 83,
@@ -25,14 +27,10 @@ def execute_seq(input_seq: [int]) -> [int]:
 
 
 def find_noun_verb(nouns: [int], verbs: [int], desired_output: int, input_seq: [int]) -> (int, int):
-    for noun in nouns:
-        for verb in verbs:
-            modified_seq = input_seq.copy()
-            modified_seq[1] = noun
-            modified_seq[2] = verb
-            out_seq = execute_seq(modified_seq)
-            if out_seq[0] == desired_output:
-                return noun, verb
+    # one symbolic run, the output is affine in noun and verb and gets solved for them
+    for solution in find_inputs(input_seq, {1: "noun", 2: "verb"}, {"noun": nouns, "verb": verbs}, desired_output,
+                                address=0):
+        return solution["noun"], solution["verb"]
     return None, None
 
 
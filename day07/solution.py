@@ -1,267 +1,6 @@
-from dataclasses import dataclass
-from enum import Enum
 import itertools
 
-class ParameterMode(Enum):
-    POSITION = 0
-    IMMEDIATE = 1
-
-
-@dataclass
-class Parameter:
-    value: int
-    mode: ParameterMode
-
-    def read(self, memory):
-        return self.value if self.mode == ParameterMode.IMMEDIATE else memory[self.value]
-
-    def write(self, memory, value):
-        if self.mode == ParameterMode.IMMEDIATE:
-            raise Exception("Can not write to memory at the position of immediate parameter")
-        else:
-            memory[self.value] = value
-
-
-@dataclass
-class InstructionDescriptor:
-    value: int
-
-    def opcode(self):
-        return self.value % 100
-
-    def parameter_mode(self, parameter_order: int) -> ParameterMode:
-        digit_position = parameter_order + 1
-        mode = ((self.value % pow(10, digit_position + 1)) - (self.value % pow(10, digit_position)))//pow(10, digit_position)
-        return ParameterMode(mode)
-
-
-class IO:
-    def __init__(self, inputs, outputs = []):
-        self.inputs = inputs
-        self.outputs = outputs
-
-    def read(self):
-        if not self.inputs:
-            raise Exception("IO input buffer is empty when trying to read")
-        return self.inputs.pop(0)
-
-    def write(self, value: int):
-        self.outputs.append(value)
-
-
-@dataclass
-class HaltInstruction:
-
-    @staticmethod
-    def from_memory(memory, address):
-        descriptor = InstructionDescriptor(memory[address])
-        return HaltInstruction() if descriptor.opcode() == 99 else None
-
-    def execute(self, memory, address, io=None):
-        # NOOP
-        return address
-
-
-@dataclass
-class AddInstruction:
-    parameter1: Parameter
-    parameter2: Parameter
-    parameter3: Parameter
-
-    @classmethod
-    def from_memory(cls, memory, address):
-        descriptor = InstructionDescriptor(memory[address])
-        return cls(
-            Parameter(memory[address + 1], descriptor.parameter_mode(1)),
-            Parameter(memory[address + 2], descriptor.parameter_mode(2)),
-            Parameter(memory[address + 3], descriptor.parameter_mode(3))
-        ) if descriptor.opcode() == 1 else None
-
-    def execute(self, memory, address, io=None):
-        result = self.parameter1.read(memory) + self.parameter2.read(memory)
-        self.parameter3.write(memory, result)
-        return address + 4
-
-
-@dataclass
-class MultiplyInstruction:
-    parameter1: Parameter
-    parameter2: Parameter
-    parameter3: Parameter
-
-    @classmethod
-    def from_memory(cls, memory, address):
-        descriptor = InstructionDescriptor(memory[address])
-        return cls(
-            Parameter(memory[address + 1], descriptor.parameter_mode(1)),
-            Parameter(memory[address + 2], descriptor.parameter_mode(2)),
-            Parameter(memory[address + 3], descriptor.parameter_mode(3))
-        ) if descriptor.opcode() == 2 else None
-
-    def execute(self, memory, address, io=None):
-        result = self.parameter1.read(memory) * self.parameter2.read(memory)
-        self.parameter3.write(memory, result)
-        return address + 4
-
-
-@dataclass
-class InputInstruction:
-    parameter: Parameter
-
-    @classmethod
-    def from_memory(cls, memory, address):
-        descriptor = InstructionDescriptor(memory[address])
-        return cls(
-            Parameter(memory[address + 1], descriptor.parameter_mode(1)),
-        ) if descriptor.opcode() == 3 else None
-
-    def execute(self, memory, address, io):
-        self.parameter.write(memory, io.read())
-        return address + 2
-
-
-@dataclass
-class OutputInstruction:
-    parameter: Parameter
-
-    @classmethod
-    def from_memory(cls, memory, address):
-        descriptor = InstructionDescriptor(memory[address])
-        return cls(
-            Parameter(memory[address + 1], descriptor.parameter_mode(1)),
-        ) if descriptor.opcode() == 4 else None
-
-    def execute(self, memory, address, io):
-        io.write(self.parameter.read(memory))
-        return address + 2
-
-
-@dataclass
-class JumpIfTrueInstruction:
-    parameter1: Parameter
-    parameter2: Parameter
-
-    @classmethod
-    def from_memory(cls, memory, address):
-        descriptor = InstructionDescriptor(memory[address])
-        return cls(
-            Parameter(memory[address + 1], descriptor.parameter_mode(1)),
-            Parameter(memory[address + 2], descriptor.parameter_mode(2))
-        ) if descriptor.opcode() == 5 else None
-
-    def execute(self, memory, address, io=None):
-        if self.parameter1.read(memory) > 0:
-            return self.parameter2.read(memory)
-        else:
-            return address + 3
-
-
-@dataclass
-class JumpIfFalseInstruction:
-    parameter1: Parameter
-    parameter2: Parameter
-
-    @classmethod
-    def from_memory(cls, memory, address):
-        descriptor = InstructionDescriptor(memory[address])
-        return cls(
-            Parameter(memory[address + 1], descriptor.parameter_mode(1)),
-            Parameter(memory[address + 2], descriptor.parameter_mode(2))
-        ) if descriptor.opcode() == 6 else None
-
-    def execute(self, memory, address, io=None):
-        if self.parameter1.read(memory) == 0:
-            return self.parameter2.read(memory)
-        else:
-            return address + 3
-
-
-@dataclass
-class LessThenInstruction:
-    parameter1: Parameter
-    parameter2: Parameter
-    parameter3: Parameter
-
-    @classmethod
-    def from_memory(cls, memory, address):
-        descriptor = InstructionDescriptor(memory[address])
-        return cls(
-            Parameter(memory[address + 1], descriptor.parameter_mode(1)),
-            Parameter(memory[address + 2], descriptor.parameter_mode(2)),
-            Parameter(memory[address + 3], descriptor.parameter_mode(3))
-        ) if descriptor.opcode() == 7 else None
-
-    def execute(self, memory, address, io=None):
-        if self.parameter1.read(memory) < self.parameter2.read(memory):
-            self.parameter3.write(memory, 1)
-        else:
-            self.parameter3.write(memory, 0)
-        return address + 4
-
-
-@dataclass
-class EqualsInstruction:
-    parameter1: Parameter
-    parameter2: Parameter
-    parameter3: Parameter
-
-    @classmethod
-    def from_memory(cls, memory, address):
-        descriptor = InstructionDescriptor(memory[address])
-        return cls(
-            Parameter(memory[address + 1], descriptor.parameter_mode(1)),
-            Parameter(memory[address + 2], descriptor.parameter_mode(2)),
-            Parameter(memory[address + 3], descriptor.parameter_mode(3))
-        ) if descriptor.opcode() == 8 else None
-
-    def execute(self, memory, address, io=None):
-        if self.parameter1.read(memory) == self.parameter2.read(memory):
-            self.parameter3.write(memory, 1)
-        else:
-            self.parameter3.write(memory, 0)
-        return address + 4
-
-
-class IntcodeProgram:
-    memory: [int]
-    address: int
-
-    def __init__(self, program):
-        self.memory = program.copy()
-        self.address = 0
-        self.halted = False
-        self.instruction_types = [
-            AddInstruction, MultiplyInstruction, InputInstruction, OutputInstruction,
-            JumpIfTrueInstruction, JumpIfFalseInstruction, LessThenInstruction, EqualsInstruction,
-            HaltInstruction
-        ]
-
-    def next_instruction(self):
-        for type in self.instruction_types:
-            instruction = type.from_memory(self.memory, self.address)
-            if instruction:
-                return instruction
-        raise Exception(f"Unkown instruction descriptor {self.memory[self.address]} at position {self.address}")
-
-    def execute(self, inputs):
-        io = IO(inputs)
-        while not self.halted:
-            instruction = self.next_instruction()
-            self.address = instruction.execute(self.memory, self.address, io)
-            self.halted = isinstance(instruction, HaltInstruction)
-        return io.outputs
-
-    def execute_until_output_or_halt(self, io):
-        while True:
-            instruction = self.next_instruction()
-            self.address = instruction.execute(self.memory, self.address, io)
-            if isinstance(instruction, HaltInstruction):
-                self.halted = True
-                break
-            if isinstance(instruction, OutputInstruction):
-                break
-
-        return io
+from aoc2019.intcode import ExecutionInterrupt, IntcodeProgram
 
 
 def generate_phase_settings(settings_range):
@@ -271,7 +10,7 @@ def generate_phase_settings(settings_range):
 
 def create_amplifier(prog):
     def amplify(phase, input):
-        outputs = IntcodeProgram(prog).execute([phase, input])
+        outputs = IntcodeProgram(prog, [phase, input]).execute().io.outputs
         return outputs[0]
     return amplify
 
@@ -285,44 +24,24 @@ def thruster_signal(prog, phase_settings):
     return a4
 
 
-class FeedbackIO:
-
-    def __init__(self, buffer01, buffer12, buffer23, buffer34, buffer40):
-        self.buffer01 = buffer01
-        self.buffer12 = buffer12
-        self.buffer23 = buffer23
-        self.buffer34 = buffer34
-        self.buffer40 = buffer40
-        self.io0 = IO(self.buffer40, self.buffer01)
-        self.io1 = IO(self.buffer01, self.buffer12)
-        self.io2 = IO(self.buffer12, self.buffer23)
-        self.io3 = IO(self.buffer23, self.buffer34)
-        self.io4 = IO(self.buffer34, self.buffer40)
-
-
 def thruster_signal_with_feedback(prog, phase_settings):
-
-    fio = FeedbackIO(
-        [phase_settings[1]],
-        [phase_settings[2]],
-        [phase_settings[3]],
-        [phase_settings[4]],
-        [phase_settings[0], 0] # plus initial input
-    )
-
-    a0 = IntcodeProgram(prog)
-    a1 = IntcodeProgram(prog)
-    a2 = IntcodeProgram(prog)
-    a3 = IntcodeProgram(prog)
-    a4 = IntcodeProgram(prog)
-
-    while not all([a0.halted, a1.halted, a2.halted, a3.halted, a4.halted]):
-        a0.execute_until_output_or_halt(fio.io0)
-        a1.execute_until_output_or_halt(fio.io1)
-        a2.execute_until_output_or_halt(fio.io2)
-        a3.execute_until_output_or_halt(fio.io3)
-        a4.execute_until_output_or_halt(fio.io4)
-    return fio.buffer40[0]
+    buffer01 = [phase_settings[1]]
+    buffer12 = [phase_settings[2]]
+    buffer23 = [phase_settings[3]]
+    buffer34 = [phase_settings[4]]
+    buffer40 = [phase_settings[0], 0] # plus initial input
+
+    a0 = IntcodeProgram(prog, buffer40, buffer01)
+    a1 = IntcodeProgram(prog, buffer01, buffer12)
+    a2 = IntcodeProgram(prog, buffer12, buffer23)
+    a3 = IntcodeProgram(prog, buffer23, buffer34)
+    a4 = IntcodeProgram(prog, buffer34, buffer40)
+
+    amplifiers = [a0, a1, a2, a3, a4]
+    while not all(a.halted for a in amplifiers):
+        for a in amplifiers:
+            a.execute_until_interrupt({ExecutionInterrupt.HAS_OUTPUT})
+    return buffer40[0]
 
 
 def max_thruster_signal(program_string, settings_range=range(5)):
@@ -1,10 +1,8 @@
-from aoc2019.intcode import IntcodeProgram
+from aoc2019.intcode import IntcodeProgram, load_program
 
-program = [int(s) for s in open("day21/input1.txt").read().strip().split(',')]
+program = load_program("day21/input1.txt")
 
-inputs = []
-outputs = []
-p = IntcodeProgram(program, inputs, outputs)
+p = IntcodeProgram(program, [])
 lines = [
     # can land safely and there is something to jump over
     "NOT A T",
@@ -22,17 +20,8 @@ lines = [
     # and could step one step and then jump
     "RUN"
 ]
-for line in lines:
-    inputs.extend([ord(ch) for ch in line])
-    inputs.append(10)
-p.execute()
-message = []
-damage = None
-for i in outputs:
-    if i < 255:
-        message.append(chr(i))
-    else:
-        damage = i
+p.send_lines(lines)
+output = p.read_until_prompt(text_limit=255)
 
-print(''.join(message))
-print(damage if damage is not None else "CRASH")
+print(output.text)
+print(output.values[-1] if output.values else "CRASH")
@@ -1,12 +1,13 @@
-from aoc2019.intcode import IntcodeProgram, ExecutionInterrupt
+from aoc2019.intcode import ExecutionInterrupt, IntcodeProgram, load_program
+from collections import deque
 from dataclasses import dataclass
 
 
 class NetworkDevice:
     def __init__(self, address, prog):
         self.address = address
-        self.inputs = [address]
-        self.outputs = []
+        self.inputs = deque([address])
+        self.outputs = deque()
         self.program = IntcodeProgram(prog, self.inputs, self.outputs)
         self.out_buffer = []
         self.in_buffer = None
@@ -22,12 +23,12 @@ class NetworkDevice:
                 self.inputs.append(self.in_buffer[2])
                 self.in_buffer = None
             elif net_in:
-                self.in_buffer = net_in.pop(0)
+                self.in_buffer = net_in.popleft()
                 self.inputs.append(self.in_buffer[1])
             else:
                 self.inputs.append(-1)
         if result == ExecutionInterrupt.HAS_OUTPUT:
-            self.out_buffer.append(self.outputs.pop(0))
+            self.out_buffer.append(self.outputs.popleft())
             if len(self.out_buffer) == 3:
                 net_out.append(tuple(self.out_buffer))
                 self.out_buffer.clear()
@@ -43,9 +44,9 @@ class Network:
 
     @classmethod
     def create(cls, n):
-        program = [int(s) for s in open("day23/input1.txt").read().strip().split(',')]
+        program = load_program("day23/input1.txt")
         devices = [NetworkDevice(address, program) for address in range(n)]
-        in_queues = {i: [] for i in range(n)}
+        in_queues = {i: deque() for i in range(n)}
         return Network(devices, in_queues, [])
 
     def is_idle(self):
@@ -53,12 +54,12 @@ class Network:
 
     def run(self):
         last_nat_packet_y = None
-        channel = []
+        channel = deque()
         while True:
             for i, device in enumerate(self.devices):
                 device.tick(self.in_queues[i], channel)
                 if channel:
-                    packet = channel.pop(0)
+                    packet = channel.popleft()
                     print(packet)
                     if packet[0] == 255:
                         self.nat_packet.clear()
@@ -1,52 +1,53 @@
-from aoc2019.intcode import IntcodeProgram, ExecutionInterrupt
+from aoc2019.intcode import IntcodeProgram, load_program
+from aoc2019.replay import Recorder, recorded_for, replay
 from dataclasses import dataclass
+import os
 
 class Droid:
     def __init__(self, prog):
+        self.code = prog
         self.inputs = []
         self.outputs = []
         self.program = IntcodeProgram(prog, self.inputs, self.outputs)
 
     def report(self):
-        result = self.program.execute_until_interrupt()
-        if result == ExecutionInterrupt.HAS_OUTPUT:
-            out = ''
-            while result == ExecutionInterrupt.HAS_OUTPUT:
-                out += ''.join([chr(i) for i in self.outputs])
-                self.outputs.clear()
-                result = self.program.execute_until_interrupt()
+        out = self.program.read_until_prompt().text
+        if out:
             print(out)
 
     def command(self, cmd, interactive = False):
         if interactive:
             print(f"{cmd}")
-        for c in cmd:
-            self.inputs.append(ord(c))
-        self.inputs.append(10) # end of line
-        result = self.program.execute_until_interrupt()
-        if result == ExecutionInterrupt.HALT:
+        self.program.send_line(cmd)
+        out = self.program.read_until_prompt().text
+        if not out:
             return
-        if result == ExecutionInterrupt.NEED_INPUT:
-            return
-        if result == ExecutionInterrupt.HAS_OUTPUT:
-            out = ''
-            while result == ExecutionInterrupt.HAS_OUTPUT:
-                out += ''.join([chr(i) for i in self.outputs])
-                self.outputs.clear()
-                result = self.program.execute_until_interrupt()
-            if interactive:
-                print(out)
-            return out
+        if interactive:
+            print(out)
+        return out
 
     def play(self):
         while True:
             cmd = input()
             self.command(cmd, interactive=True)
 
-    def play_script(self, lines):
-        lines = [line.strip() for line in lines.splitlines() if len(line.strip())]
+    def play_script(self, lines, session=None):
+        if isinstance(lines, str):
+            lines = lines.splitlines()
+        lines = [line.strip() for line in lines if len(line.strip())]
+        # a recorded session of the same script resumes at its end state without replaying the commands
+        if session is not None and os.path.exists(session):
+            with open(session, 'rb') as f:
+                data = f.read()
+            if recorded_for(self.code, data, lines):
+                self.program = replay(self.code, data, self.inputs, self.outputs, script=lines)
+                return
+        recorder = Recorder(self.program, script=lines) if session is not None else None
         for cmd in lines:
             self.command(cmd)
+        if recorder is not None:
+            recorder.save(session)
+            recorder.stop()
 
     def brute_force(self):
         def parse_inv(text):
@@ -77,7 +78,7 @@ class Droid:
             print(f"{taken_items} -> {result}")
 
 
-p = [int(s) for s in open("day25/input1.txt").read().strip().split(',')]
+p = load_program("day25/input1.txt")
 droid = Droid(p)
 droid.report()
 droid.play_script("""
@@ -107,7 +108,7 @@ take ornament
 west
 south
 inv
-""")
+""", session="day25/walkthrough.icr")
 # droid.brute_force()
 droid.play()
 # ['ornament', 'easter egg', 'hypercube', 'monolith']